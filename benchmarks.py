@@ -0,0 +1,106 @@
+"""
+Eviscape API toolkit
+Copyright (c) 2009 Music Pictures Ltd
+Author: Deepak Thukral
+License: MIT
+
+Micro benchmarks of the request signing hot path.
+Usage: python benchmarks.py
+"""
+import random
+import threading
+import time
+from timeit import Timer
+
+from pyeviscape import oauth
+
+THREADS = 8
+CALLS = 20000
+
+#The nonce generator pyeviscape used to ship, for comparison
+def randint_nonce(length=40):
+    return ''.join([str(random.randint(0, 9)) for i in range(length)])
+
+def best_of(func, number=CALLS, repeat=3):
+    "Best time of one call in microseconds"
+    return min(Timer(func).repeat(repeat, number)) / number * 1e6
+
+def threaded(func, threads=THREADS, calls=CALLS):
+    "Calls per second with ``threads`` threads calling ``func``"
+    def run():
+        for i in xrange(calls):
+            func()
+    workers = [threading.Thread(target=run) for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * calls / (time.time() - start)
+
+def report(name, func):
+    print "%-24s %8.2f us/call %10.0f calls/s (%d threads)" % (
+        name, best_of(func), threaded(func), THREADS)
+
+def bench_nonce():
+    print "oauth_nonce (40 digits)"
+    report('random.randint', randint_nonce)
+    report('oauth.generate_nonce', oauth.generate_nonce)
+    nonces = set([oauth.generate_nonce() for i in xrange(CALLS)])
+    assert len(nonces) == CALLS, "duplicate nonces"
+
+def bench_sign():
+    print "signed GET url (HMAC-SHA1)"
+    consumer = oauth.OAuthConsumer('key', 'secret')
+    token = oauth.OAuthToken('token', 'token secret')
+    signer = oauth.OAuthSignatureMethod_HMAC_SHA1()
+    params = {'method': 'evis.timeline', 'format': 'json', 'nojsoncallback': '1',
+              'nod_id': '17', 'per_page': '10', 'page': 1}
+    def fresh():
+        request = oauth.OAuthRequest.from_consumer_and_token(consumer, token=token,
+            http_url='http://www.eviscape.com/api/1.0/rest/', parameters=params)
+        request.sign_request(signer, consumer, token)
+        return request.to_url()
+    escaped = {}
+    def next_page():
+        # as EviscapeClient does: a new request for every page, sharing the
+        # escaped parameters of the earlier ones (only page, nonce and
+        # timestamp change)
+        params['page'] += 1
+        request = oauth.OAuthRequest.from_consumer_and_token(consumer, token=token,
+            http_url='http://www.eviscape.com/api/1.0/rest/', parameters=params)
+        request.share_escaped(escaped)
+        request.sign_request(signer, consumer, token)
+        return request.to_url()
+    report('new request', fresh)
+    report('next page', next_page)
+
+def bench_verify():
+    print "OAuthServer.verify_request (MemoryDataStore)"
+    rejected = []
+    def verifier(**kw):
+        store = oauth.MemoryDataStore(**kw)
+        consumer = store.add_consumer(oauth.OAuthConsumer('key', 'secret'))
+        token = store.add_token(oauth.OAuthToken('token', 'token secret'))
+        signer = oauth.OAuthSignatureMethod_HMAC_SHA1()
+        server = oauth.OAuthServer(store, {signer.get_name(): signer})
+        def verify():
+            request = oauth.OAuthRequest.from_consumer_and_token(consumer, token=token,
+                http_url='http://localhost/callback', parameters={'event': 'evis.post'})
+            request.sign_request(signer, consumer, token)
+            try:
+                server.verify_request(request)
+            except oauth.OAuthError:
+                # a Bloom filter false positive: the nonce taken for a replay
+                rejected.append(request)
+        return verify
+    report('sign and verify', verifier())
+    # every nonce of the run lands in one or two buckets
+    report('with bloom filter', verifier(bloom_bits=1 << 23))
+    print "%d of %d fresh requests rejected by the bloom filter" % (
+        len(rejected), (3 + THREADS) * CALLS)
+
+if __name__ == '__main__':
+    bench_nonce()
+    bench_sign()
+    bench_verify()
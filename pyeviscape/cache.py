@@ -0,0 +1,324 @@
+"""
+Eviscape API wrapper
+Author: Deepak Thukral<deepak@musicpictures.com>
+Response caches for the read-only API methods.
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import pickle
+import sys
+import threading
+import time
+from urllib import urlencode
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+# seconds a response stays fresh, per API method; methods not listed here
+# are never cached
+DEFAULT_TTLS = {
+    'node.get': 300,
+    'nodes.search': 60,
+    'members.search': 60,
+    'evis.get': 300,
+    'evis.get_files': 300,
+}
+
+
+class BaseCache(object):
+    """
+    Caches raw response bodies keyed on the API method, its normalized
+    parameters and (for protected calls) the access token.
+
+    Subclasses store the entries and implement _get, _set, _delete, _keys
+    and _evict; this class takes care of expiry, the entry count and byte
+    size limits and the hit/miss counters.
+    """
+    def __init__(self, ttls=None, max_entries=1000, max_bytes=10 * 1024 * 1024):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self.lock = threading.RLock()
+
+    def ttl(self, method):
+        "Seconds a response of ``method`` is kept, 0 if it is not cached"
+        return self.ttls.get(method, 0)
+
+    def size(self, body):
+        "Bytes accounted for an entry"
+        return len(body)
+
+    def make_key(self, method, params, token=None):
+        "Builds the cache key, ignoring the (per request) oauth parameters"
+        items = [(k, v) for k, v in params.items() if not k.startswith('oauth_')]
+        items.sort()
+        key = '%s?%s' % (method, urlencode(items))
+        if token is not None:
+            key += '#%s' % token.key
+        return key
+
+    def get(self, method, params, token=None):
+        "Returns the cached body or None"
+        key = self.make_key(method, params, token)
+        self.lock.acquire()
+        try:
+            entry = self._get(key)
+            if entry is not None and entry[0] < time.time():
+                self._delete(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+        finally:
+            self.lock.release()
+
+    def set(self, method, params, body, token=None):
+        "Stores ``body`` for the method's ttl, evicting old entries if needed"
+        ttl = self.ttl(method)
+        if not ttl or self.size(body) > self.max_bytes:
+            return
+        key = self.make_key(method, params, token)
+        self.lock.acquire()
+        try:
+            self._delete(key)
+            self._set(key, time.time() + ttl, body)
+            while len(self) > self.max_entries or self.bytes > self.max_bytes:
+                self._evict()
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            for key in self._keys():
+                self._delete(key)
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self),
+                'bytes': self.bytes}
+
+    def __len__(self):
+        return len(self._keys())
+
+
+class _Link(object):
+    __slots__ = ('key', 'expires', 'body', 'prev', 'next')
+
+
+class _LruList(object):
+    "Circular doubly linked list of _Links, most recently used after the root"
+    def __init__(self):
+        self.root = _Link()
+        self.root.prev = self.root.next = self.root
+
+    def _unlink(self, link):
+        link.prev.next = link.next
+        link.next.prev = link.prev
+
+    def _push(self, link):
+        link.prev = self.root
+        link.next = self.root.next
+        self.root.next.prev = link
+        self.root.next = link
+
+
+class MemoryCache(BaseCache, _LruList):
+    """
+    In-process cache; the least recently used entries are evicted first.
+
+    Usage: utils.response_cache = MemoryCache(max_entries=5000)
+    """
+    def __init__(self, *args, **kwargs):
+        BaseCache.__init__(self, *args, **kwargs)
+        _LruList.__init__(self)
+        self.entries = {}
+
+    def _get(self, key):
+        link = self.entries.get(key)
+        if link is None:
+            return None
+        self._unlink(link)
+        self._push(link)
+        return link.expires, link.body
+
+    def _set(self, key, expires, body):
+        link = _Link()
+        link.key, link.expires, link.body = key, expires, body
+        self.entries[key] = link
+        self._push(link)
+        self.bytes += self.size(body)
+
+    def _delete(self, key):
+        link = self.entries.pop(key, None)
+        if link is not None:
+            self._unlink(link)
+            self.bytes -= self.size(link.body)
+
+    def _evict(self):
+        self._delete(self.root.prev.key)
+
+    def _keys(self):
+        return self.entries.keys()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ValidatorCache(MemoryCache):
+    """
+    Remembers the validators (ETag, Last-Modified) and the parsed data of
+    the latest response to each request, so that repeating the request can
+    be a conditional GET and a 304 Not Modified answered from memory.
+
+    Entries are (etag, last_modified, data) tuples which never expire; only
+    their number is limited. ``methods`` restricts revalidation to some API
+    methods (default: all).
+
+    Usage: utils.validator_cache = ValidatorCache(['evis.latest', 'nodes.listeners'])
+    """
+    def __init__(self, methods=None, max_entries=1000):
+        MemoryCache.__init__(self, max_entries=max_entries, max_bytes=sys.maxint)
+        self.methods = methods
+        self.not_modified = 0
+
+    def ttl(self, method):
+        if self.methods is None or method in self.methods:
+            return sys.maxint
+        return 0
+
+    def size(self, entry):
+        return 1
+
+    def stats(self):
+        stats = MemoryCache.stats(self)
+        stats['not_modified'] = self.not_modified
+        return stats
+
+
+class DiskCache(BaseCache, _LruList):
+    """
+    Cache pickling every entry to its own file in ``path``, so it survives
+    restarts. The files are scanned once on startup (oldest modification
+    time evicted first); after that the LRU order and the sizes are kept in
+    memory, so the directory must not be written by other processes.
+
+    Usage: utils.response_cache = DiskCache('/var/cache/pyeviscape')
+    """
+    def __init__(self, path, *args, **kwargs):
+        BaseCache.__init__(self, *args, **kwargs)
+        _LruList.__init__(self)
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # file name -> _Link holding the file size as its body
+        self.entries = {}
+        found = []
+        for name in os.listdir(path):
+            if name.endswith('.cache'):
+                filename = os.path.join(path, name)
+                try:
+                    found.append((os.path.getmtime(filename), name,
+                                  os.path.getsize(filename)))
+                except OSError:
+                    pass
+        found.sort()
+        for mtime, name, size in found:
+            self._add(name, size)
+
+    def _name(self, key):
+        return '%s.cache' % sha1(key).hexdigest()
+
+    def _add(self, name, size):
+        self._forget(name)
+        link = _Link()
+        link.key, link.body = name, size
+        self.entries[name] = link
+        self._push(link)
+        self.bytes += size
+
+    def _get(self, key):
+        name = self._name(key)
+        link = self.entries.get(name)
+        if link is None:
+            return None
+        filename = os.path.join(self.path, name)
+        try:
+            f = open(filename, 'rb')
+            try:
+                stored_key, expires, body = pickle.load(f)
+            finally:
+                f.close()
+            # keeps the order for the scan of the next startup
+            os.utime(filename, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self._forget(name)
+            return None
+        if stored_key != key:
+            return None
+        self._unlink(link)
+        self._push(link)
+        return expires, body
+
+    def _set(self, key, expires, body):
+        name = self._name(key)
+        filename = os.path.join(self.path, name)
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        f = open(tmp, 'wb')
+        try:
+            pickle.dump((key, expires, body), f, pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        finally:
+            f.close()
+        os.rename(tmp, filename)
+        self._add(name, size)
+
+    def _forget(self, name):
+        link = self.entries.pop(name, None)
+        if link is not None:
+            self._unlink(link)
+            self.bytes -= link.body
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+        self._forget(name)
+
+    def _delete(self, key):
+        self._remove(self._name(key))
+
+    def _evict(self):
+        self._remove(self.root.prev.key)
+
+    def _keys(self):
+        return self.entries.keys()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            for name in self.entries.keys():
+                self._remove(name)
+        finally:
+            self.lock.release()
@@ -12,13 +12,19 @@ Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
 #hashlib packages
 
 import hashlib
+import inspect
 import pickle
 import random
 import StringIO
+import threading
 import time
 import urllib
-from utils import request_get, request_protected_get, request_protected_post, SERVER, smart_str, parseDateTime
-from config import FORMATTER
+from collections import deque
+from utils import SERVER, smart_str, parseDateTime, EviscapeError
+from utils import EviscapeClient, get_client
+from workers import Job, WorkerPool
+from journal import PostInDoubt, make_key
+from urllib3 import HTTPError
     
     
 class Files(object):
@@ -28,6 +34,16 @@ class Files(object):
         self.fle_title = fle_title
         self.fle_permalink = fle_permalink
         
+    def get_content(self, client=None):
+        """
+        Download the file
+        Usage: Files(id=1, fle_permalink='http://...').get_content()
+        Returns: The file contents (None if there is no permalink)
+        """
+        if self.fle_permalink is None:
+            return None
+        return get_client(client).fetch_url(self.fle_permalink)
+        
     def __str__(self):
         return smart_str("File Object: %s (%s)" % (self.id, self.fle_permalink))
     
@@ -42,7 +58,7 @@ class Comments(object):
         self.ecm_insert_date = ecm_insert_date
     
     @classmethod
-    def get(self, node, evis, access_token=None, per_page=10, page=1):
+    def get(self, node, evis, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Gets comments for an evis (optionally required access_token)
         Usage: Comments.get(Nodes(id=17), Evis(id=6259, Nodes(id=17))
@@ -50,19 +66,20 @@ class Comments(object):
         Eviscape API Method: comments.get
         """
         method = "comments.get"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=node.id, evi_id=evis.id,\
-                               per_page=per_page, page=page)
+            data = client.request_get(method, nod_id=node.id, evi_id=evis.id,\
+                                      per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=node.id,\
-                                         evi_id=evis.id, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, nod_id=node.id,\
+                                                evi_id=evis.id, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_comment_json(data)
         else:
             return _handle_comment_xml(data)
     
     @classmethod
-    def post(self, node, member, evis, comment_body, access_token, per_page=10, page=1):
+    def post(self, node, member, evis, comment_body, access_token, per_page=10, page=1, deadline=None, client=None):
         """
         Posts a comments for an evis (optionally required access_token)
         Usage: Comments.post(Nodes(id=17), Members(id=13), Evis(id=6259, Nodes(id=17), "Hello World")
@@ -70,14 +87,29 @@ class Comments(object):
         Eviscape API Method: comment.post
         """
         method="comment.post"
-        data = request_protected_post(method, access_token, nod_id=node.id,\
-                                         evi_id=evis.id, mem_id=member.id, comment=comment_body,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+        client = get_client(client)
+        data = client.request_protected_post(method, access_token, nod_id=node.id,\
+                                                evi_id=evis.id, mem_id=member.id, comment=comment_body,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_comment_json(data)[0]
         else:
             return _handle_comment_xml(data)[0]
     
+    @classmethod
+    def post_many(self, items, access_token, journal=None, workers=None, deadline=None, client=None):
+        """
+        Posts many comments concurrently (``deadline`` bounds every post)
+        Usage: Comments.post_many([dict(node=Nodes(id=17), member=Members(id=13),
+                                        evis=Evis(6259, Nodes(id=17)), comment_body="Hello World")],
+                                  'token', journal=Journal('comments.journal'))
+        Returns: List of Comments object (or the exception raised for that
+        item), in the order of ``items``
+        Eviscape API Method: comment.post
+        """
+        return _post_many(Comments.post, items, access_token, journal, workers, deadline, client,\
+                          lambda item, id: Comments(id, item['node'], item['comment_body']))
+    
     def __str__(self):
         return smart_str("Comment Object: %s" % self.id)
 
@@ -92,7 +124,7 @@ class Members(object):
         self.primary_node = primary_node
         
     @classmethod
-    def get_by_token(self, access_token, per_page=10, page=1):
+    def get_by_token(self, access_token, per_page=10, page=1, deadline=None, client=None):
         """
         Get member via access_token
         Usage: Member.get_by_token(access_token)
@@ -100,15 +132,16 @@ class Members(object):
         Eviscape API Method: member.token
         """
         method = "member.token"
-        data = request_protected_get(method, access_token, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+        client = get_client(client)
+        data = client.request_protected_get(method, access_token, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_member_json(data)[0]
         else:
             return _handle_member_xml(data)[0]
         
 
     @classmethod
-    def search(self, q, per_page=10, page=1):
+    def search(self, q, per_page=10, page=1, deadline=None, client=None):
         """
         Search members on eviscape
         Usage: Members.search("deepak")
@@ -116,11 +149,26 @@ class Members(object):
         Eviscape API Method: members.search
         """
         method = "members.search"
-        data = request_get(method, q=q, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+        client = get_client(client)
+        data = client.request_get(method, q=q, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_member_json(data)
         else:
             return _handle_member_xml(data)
+    
+    @classmethod
+    def search_many(self, queries, per_page=10, page=1, workers=None, deadline=None, client=None):
+        """
+        Search members on eviscape for many queries concurrently (``deadline``
+        bounds every search)
+        Usage: Members.search_many(["deepak", "simon"])
+        Returns: List with a list of Members object per query (or the
+        exception raised for it), in the order of ``queries``
+        Eviscape API Method: members.search
+        """
+        return _get_many(lambda q: Members.search(q, per_page=per_page, page=page, deadline=deadline,\
+                                                  client=client),\
+                         queries, workers, client)
         
     
     def __str__(self):
@@ -147,8 +195,18 @@ class Nodes(object):
         else:
             self.nod_logo_image = None
         self.nod_strict = nod_strict
+    
+    def get_logo(self, client=None):
+        """
+        Download the logo image of a Node/Profile/Evisite
+        Usage: Nodes(id=17).get().get_logo()
+        Returns: The image data (None if the node has no logo)
+        """
+        if self.nod_logo_image is None:
+            return None
+        return get_client(client).fetch_url(self.nod_logo_image)
         
-    def get(self, access_token=None, per_page=10, page=1):
+    def get(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get details of a Node/Profile/Evisite
         Usage: Nodes(id=17).get()
@@ -156,18 +214,32 @@ class Nodes(object):
         Eviscape API Method: node.get
         """
         method="node.get"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=self.id, per_page=per_page, page=page)
+            data = client.request_get(method, nod_id=self.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=self.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, nod_id=self.id,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)[0]
         else:
             return _handle_node_xml(data)[0]
     
+    @classmethod
+    def get_many(self, ids, access_token=None, workers=None, deadline=None, client=None):
+        """
+        Get details of many Nodes/Profile/Evisite concurrently (``deadline``
+        bounds every call)
+        Usage: Nodes.get_many([17, 157])
+        Returns: List of Nodes object (or the exception raised for that id),
+        in the order of ``ids``
+        Eviscape API Method: node.get
+        """
+        return _get_many(lambda id: Nodes(id).get(access_token=access_token, deadline=deadline,\
+                                                  client=client),\
+                         ids, workers, client)
     
-    def listeners(self, access_token=None, per_page=10, page=1):
+    def listeners(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get Listeners/Followers of a Node/Profile/Evisite
         Usage: Nodes(id=17).listeners()
@@ -175,18 +247,19 @@ class Nodes(object):
         Eviscape API Method: nodes.listeners
         """
         method = "nodes.listeners"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=self.id, per_page=per_page, page=page)
+            data = client.request_get(method, nod_id=self.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=self.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, nod_id=self.id,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)
         else:
             return _handle_node_xml(data)
         
     
-    def speakers(self, access_token=None, per_page=10, page=1):
+    def speakers(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get Nodes/Profile/Evisite which base node is Followering 
         Usage: Nodes(id=17).speakers()
@@ -194,18 +267,19 @@ class Nodes(object):
         Eviscape API Method: nodes.speakers
         """
         method = "nodes.speakers"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=self.id, per_page=per_page, page=page)
+            data = client.request_get(method, nod_id=self.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=self.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, nod_id=self.id,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)
         else:
             return _handle_node_xml(data)
     
     @classmethod
-    def get_for_member(self, member_name, perms='write', access_token=None, per_page=10, page=1):
+    def get_for_member(self, member_name, perms='write', access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get Node/Profile/Evisite of a User/Member
         Usage: Nodes.get_for_memnber("iapain")
@@ -213,18 +287,19 @@ class Nodes(object):
         Eviscape API Method: nodes.get
         """
         method = "nodes.member"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, mem_name=member_name, perms=perms, per_page=per_page, page=page)
+            data = client.request_get(method, mem_name=member_name, perms=perms, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, mem_name=member_name,\
-                                          perms=perms, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, mem_name=member_name,\
+                                                 perms=perms, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)
         else:
             return _handle_node_xml(data)
     
     @classmethod
-    def created_by_member(self, member_name, access_token=None, per_page=10, page=1):
+    def created_by_member(self, member_name, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get Node/Profile/Evisite which was created by User/Member
         Usage: Nodes.created_by_member("iapain")
@@ -232,18 +307,19 @@ class Nodes(object):
         Eviscape API Method: nodes.get
         """
         method = "nodes.get"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, mem_name=member_name, per_page=per_page, page=page)
+            data = client.request_get(method, mem_name=member_name, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, mem_name=member_name,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, mem_name=member_name,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)
         else:
             return _handle_node_xml(data) 
     
     @classmethod
-    def search(self, q, per_page=10, page=1):
+    def search(self, q, per_page=10, page=1, deadline=None, client=None):
         """
         Searches Nodes/Evisite/Profile on eviscape (public only)
         Usage: Nodes.search('iapain')
@@ -251,8 +327,9 @@ class Nodes(object):
         Eviscape API Method: nodes.search
         """
         method = "nodes.search"
-        data = request_get(method, q=q, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+        client = get_client(client)
+        data = client.request_get(method, q=q, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_node_json(data)
         else:
             return _handle_node_xml(data)
@@ -277,7 +354,7 @@ class Evis(object):
         self.files = files
         
         
-    def get(self, access_token=None, per_page=10, page=1):
+    def get(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get an Evis/Post/Article
         Usage: Evis(id=6369).get()
@@ -285,18 +362,32 @@ class Evis(object):
         Eviscape API Method: evis.get
         """
         method = "evis.get"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, evi_id=self.id, nod_id=self.node.id,\
-                               per_page=per_page, page=page)
+            data = client.request_get(method, evi_id=self.id, nod_id=self.node.id,\
+                                      per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, evi_id=self.id,\
-                                         nod_id=self.node.id, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, evi_id=self.id,\
+                                                nod_id=self.node.id, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_evis_json(data)[0]
         else:
             return _handle_evis_xml(data)[0]
     
-    def get_files(self, access_token=None, per_page=10, page=1):
+    @classmethod
+    def get_many(self, pairs, access_token=None, workers=None, deadline=None, client=None):
+        """
+        Get many Evis/Post/Article concurrently (``deadline`` bounds every call)
+        Usage: Evis.get_many([(6369, 157), (6259, 17)])
+        Returns: List of Evis object (or the exception raised for that
+        (evi_id, nod_id) pair), in the order of ``pairs``
+        Eviscape API Method: evis.get
+        """
+        return _get_many(lambda pair: Evis(pair[0], Nodes(pair[1])).get(access_token=access_token,\
+                                                                         deadline=deadline, client=client),\
+                         pairs, workers, client)
+    
+    def get_files(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get Files belongs to an Evis/Post/Article
         Usage: Evis(id=6369).get_files()
@@ -304,13 +395,14 @@ class Evis(object):
         Eviscape API Method: evis.get_files
         """
         method = "evis.get_files"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, evi_id=self.id, nod_id=self.node.id,\
-                               per_page=per_page, page=page)
+            data = client.request_get(method, evi_id=self.id, nod_id=self.node.id,\
+                                      per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, evi_id=self.id,\
-                                         nod_id=self.node.id, per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, evi_id=self.id,\
+                                                nod_id=self.node.id, per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             self.files = _handle_file_json(data)
         else:
             self.files = _handle_file_xml(data)
@@ -319,7 +411,7 @@ class Evis(object):
     
     @classmethod
     def post(self, evi_subject, evi_body, evi_type, member, node, evis_tags,\
-             access_token, evis_is_draft=False, per_page=10, page=1):
+             access_token, evis_is_draft=False, per_page=10, page=1, deadline=None, client=None):
         """
         Posts an Evis/Post/Article
         Usage: Evis.post('Cool', 'I am feeling cool', 'text', Members(id=13), Nodes(id=17), 'cool test')
@@ -327,19 +419,35 @@ class Evis(object):
         Eviscape API Method: evis.post
         """
         method = "evis.post"
-        data = request_protected_post(method, access_token, evi_subject=evi_subject,\
-                                      evi_body=evi_body, evi_type=evi_type,\
-                                      mem_id=member.id, nod_id=node.id,\
-                                      evi_tags=evis_tags, evis_is_draft=evis_is_draft,\
-                                      per_page=per_page, page=page)
+        client = get_client(client)
+        data = client.request_protected_post(method, access_token, evi_subject=evi_subject,\
+                                             evi_body=evi_body, evi_type=evi_type,\
+                                             mem_id=member.id, nod_id=node.id,\
+                                             evi_tags=evis_tags, evis_is_draft=evis_is_draft,\
+                                             per_page=per_page, page=page, deadline=deadline)
         
-        if FORMATTER == 'json':
+        if client.formatter == 'json':
             return _handle_evis_json(data)[0]
         else:
             return _handle_evis_xml(data)[0]
+    
+    @classmethod
+    def post_many(self, items, access_token, journal=None, workers=None, deadline=None, client=None):
+        """
+        Posts many Evis/Post/Article concurrently (``deadline`` bounds every post)
+        Usage: Evis.post_many([dict(evi_subject='Cool', evi_body='I am feeling cool', evi_type='text',
+                                    member=Members(id=13), node=Nodes(id=17), evis_tags='cool test')],
+                              'token', journal=Journal('import.journal'))
+        Returns: List of Evis object (or the exception raised for that item),
+        in the order of ``items``
+        Eviscape API Method: evis.post
+        """
+        return _post_many(Evis.post, items, access_token, journal, workers, deadline, client,\
+                          lambda item, id: Evis(id, item['node'], item['member'],\
+                                                item['evi_subject'], item['evi_body'], item['evi_type']))
             
     @classmethod
-    def timeline(self, member, node, access_token, per_page=10, page=1):
+    def timeline(self, member, node, access_token, per_page=10, page=1, deadline=None, client=None):
         """
         Get timeline for a member
         Usage: Evis.timeline(memberobj, nodeobj, 'token')
@@ -347,17 +455,18 @@ class Evis(object):
         Eviscape API method: evis.timeline
         """
         method = "evis.timeline"
-        data = request_protected_get(method, access_token, mem_id=member.id,\
-                                      nod_id=node.id, per_page=per_page, page=page)
+        client = get_client(client)
+        data = client.request_protected_get(method, access_token, mem_id=member.id,\
+                                             nod_id=node.id, per_page=per_page, page=page, deadline=deadline)
         
-        if FORMATTER == 'json':
+        if client.formatter == 'json':
             return _handle_evis_json(data)
         else:
             return _handle_evis_xml(data)
         
     
     @classmethod
-    def xsearch(self, query, access_token=None, per_page=10, page=1):
+    def xsearch(self, query, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Search an Evis/Post/Article
         Usage: Evis.search('bon jovi OR metallica')
@@ -365,26 +474,22 @@ class Evis(object):
         Eviscape API Method: evis.search
         """
         method = "evis.search"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, q=query, per_page=per_page, page=page)
+            objects = client.request_iter(method, q=query, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, q=query,\
-                                         per_page=per_page, page=page)
-        
-        if FORMATTER == 'json':
-            if isinstance(data.get('objects', None), list):
-                for evi in data['objects']:
-                    yield _parse_evis(evi)
+            objects = client.request_protected_iter(method, access_token, q=query,\
+                                                    per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
+            for evi in objects:
+                yield _parse_evis_json(evi)
         else:
-            if data.rsp.objects.__dict__.has_key('evis'):
-                if isinstance(data.rsp.objects.evis, list):
-                    for evi in data.rsp.objects.evis:
-                        yield _parse_evis(evi)
-                else:
-                    yield _parse_evis(data.rsp.objects.evis)
+            for tag, evi in objects:
+                if tag == 'evis':
+                    yield _parse_evis(evi)
     
     @classmethod
-    def xsent(self, node, access_token=None, per_page=10, page=1):
+    def xsent(self, node, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get all posted Evis/Post/Article of a Node/Profile/Evisite
         Usage: Evis.xsent(Nodes(id=17))
@@ -392,25 +497,22 @@ class Evis(object):
         Eviscape API Method: evis.sent
         """
         method = "evis.sent"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=node.id, per_page=per_page, page=page)
+            objects = client.request_iter(method, nod_id=node.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=node.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
-            if isinstance(data.get('objects', None), list):
-                for evi in data['objects']:
-                    yield _parse_evis(evi)
+            objects = client.request_protected_iter(method, access_token, nod_id=node.id,\
+                                                    per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
+            for evi in objects:
+                yield _parse_evis_json(evi)
         else:
-            if data.rsp.objects.__dict__.has_key('evis'):
-                if isinstance(data.rsp.objects.evis, list):
-                    for evi in data.rsp.objects.evis:
-                        yield _parse_evis(evi)
-                else:
-                    yield _parse_evis(data.rsp.objects.evis)
+            for tag, evi in objects:
+                if tag == 'evis':
+                    yield _parse_evis(evi)
                 
     @classmethod
-    def xreceived(self, member, node, access_token=None, per_page=10, page=1):
+    def xreceived(self, member, node, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get all received Evis/Post/Article of a Node/Profile/Evisite
         Usage: Evis.xreceived(Member(id=13), Nodes(id=17))
@@ -418,25 +520,22 @@ class Evis(object):
         Eviscape API Method: evis.received
         """
         method = "evis.received"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, mem_id=member.id, nod_id=node.id, per_page=per_page, page=page)
+            objects = client.request_iter(method, mem_id=member.id, nod_id=node.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, mem_id=member.id, nod_id=node.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
-            if isinstance(data.get('objects', None), list):
-                for evi in data['objects']:
-                    yield _parse_evis(evi)
+            objects = client.request_protected_iter(method, access_token, mem_id=member.id, nod_id=node.id,\
+                                                    per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
+            for evi in objects:
+                yield _parse_evis_json(evi)
         else:
-            if data.rsp.objects.__dict__.has_key('evis'):
-                if isinstance(data.rsp.objects.evis, list):
-                    for evi in data.rsp.objects.evis:
-                        yield _parse_evis(evi)
-                else:
-                    yield _parse_evis(data.rsp.objects.evis)
+            for tag, evi in objects:
+                if tag == 'evis':
+                    yield _parse_evis(evi)
                 
     @classmethod
-    def xlatest(self, access_token=None, per_page=10, page=1):
+    def xlatest(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get all latest evis
         Usage: Evis.xlatest()
@@ -444,25 +543,22 @@ class Evis(object):
         Eviscape API Method: evis.latest
         """
         method = "evis.latest"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, per_page=per_page, page=page)
+            objects = client.request_iter(method, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
-            if isinstance(data.get('objects', None), list):
-                for evi in data['objects']:
-                    yield _parse_evis(evi)
+            objects = client.request_protected_iter(method, access_token,\
+                                                    per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
+            for evi in objects:
+                yield _parse_evis_json(evi)
         else:
-            if data.rsp.objects.__dict__.has_key('evis'):
-                if isinstance(data.rsp.objects.evis, list):
-                    for evi in data.rsp.objects.evis:
-                        yield _parse_evis(evi)
-                else:
-                    yield _parse_evis(data.rsp.objects.evis)
+            for tag, evi in objects:
+                if tag == 'evis':
+                    yield _parse_evis(evi)
                 
     @classmethod
-    def search(self, query, access_token=None, per_page=10, page=1):
+    def search(self, query, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Search an Evis/Post/Article
         Usage: Evis.search('bon jovi OR metallica')
@@ -470,19 +566,20 @@ class Evis(object):
         Eviscape API Method: evis.search
         """
         method = "evis.search"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, q=query, per_page=per_page, page=page)
+            data = client.request_get(method, q=query, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, q=query,\
-                                         per_page=per_page, page=page)
+            data = client.request_protected_get(method, access_token, q=query,\
+                                                per_page=per_page, page=page, deadline=deadline)
             
-        if FORMATTER == 'json':
+        if client.formatter == 'json':
             return _handle_evis_json(data)
         else:
             return _handle_evis_xml(data)
     
     @classmethod
-    def sent(self, node, access_token=None, per_page=100, page=1):
+    def sent(self, node, access_token=None, per_page=100, page=1, deadline=None, client=None):
         """
         Get all posted Evis/Post/Article of a Node/Profile/Evisite
         Usage: Evis.sent(Nodes(id=17))
@@ -490,18 +587,19 @@ class Evis(object):
         Eviscape API Method: evis.sent
         """
         method = "evis.sent"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, nod_id=node.id, per_page=per_page, page=page)
+            data = client.request_get(method, nod_id=node.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, nod_id=node.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, nod_id=node.id,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_evis_json(data)
         else:
             return _handle_evis_xml(data)
     
     @classmethod
-    def received(self, member, node, access_token=None, per_page=10, page=1):
+    def received(self, member, node, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get all received Evis/Post/Article of a Node/Profile/Evisite
         Usage: Evis.received(Member(id=13), Nodes(id=17))
@@ -509,18 +607,19 @@ class Evis(object):
         Eviscape API Method: evis.received
         """
         method = "evis.received"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, mem_id=member.id, nod_id=node.id, per_page=per_page, page=page)
+            data = client.request_get(method, mem_id=member.id, nod_id=node.id, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token, mem_id=member.id, nod_id=node.id,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token, mem_id=member.id, nod_id=node.id,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_evis_json(data)
         else:
             return _handle_evis_xml(data)
     
     @classmethod
-    def latest(self, access_token=None, per_page=10, page=1):
+    def latest(self, access_token=None, per_page=10, page=1, deadline=None, client=None):
         """
         Get all latest Evis/Post/Article
         Usage: Evis.latest()
@@ -528,12 +627,13 @@ class Evis(object):
         Eviscape API Method: evis.latest
         """
         method = "evis.latest"
+        client = get_client(client)
         if access_token is None:
-            data = request_get(method, per_page=per_page, page=page)
+            data = client.request_get(method, per_page=per_page, page=page, deadline=deadline)
         else:
-            data = request_protected_get(method, access_token,\
-                                         per_page=per_page, page=page)
-        if FORMATTER == 'json':
+            data = client.request_protected_get(method, access_token,\
+                                                per_page=per_page, page=page, deadline=deadline)
+        if client.formatter == 'json':
             return _handle_evis_json(data)
         else:
             return _handle_evis_xml(data)
@@ -542,49 +642,140 @@ class Evis(object):
         return smart_str("Evis Object: %s (%s)" % (self.id, self.evi_permalink))
     
 
+# threads running the calls made through defer(); None sizes the pool
+# from the connection pool of the client the call uses
+DEFER_WORKERS = None
+
+# pool size -> WorkerPool running the calls made through defer()
+_defer_pools = {}
+_defer_lock = threading.Lock()
+
+def _defer_pool(client=None):
+    size = DEFER_WORKERS or get_client(client).http_pool.maxsize
+    _defer_lock.acquire()
+    try:
+        pool = _defer_pools.get(size)
+        if pool is None:
+            pool = _defer_pools[size] = WorkerPool(size)
+        return pool
+    finally:
+        _defer_lock.release()
+
+def defer(method, *args, **kwargs):
+    """
+    Run any API method in the background
+    Usage: job = defer(Evis.latest, per_page=20); ... ; evis = job.result()
+           defer(Nodes(id=17).listeners).add_done_callback(lambda job: ...)
+    Returns: A workers.Job; result() waits for the method's return value
+    (or raises its exception), add_done_callback() notifies on completion
+
+    Every call still blocks a worker thread while it waits for Eviscape;
+    there are as many workers as the ``client=`` passed to the method keeps
+    connections (or DEFER_WORKERS), and further calls queue up for them.
+    """
+    return _defer_pool(kwargs.get('client')).submit(method, *args, **kwargs)
+
+def _get_many(func, items, workers=None, client=None):
+    """
+    Calls ``func`` for every item on a pool of ``workers`` threads (default:
+    as many as the client's connection pool keeps connections)
+    """
+    pool = WorkerPool(workers or get_client(client).http_pool.maxsize)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+
+def _post_many(post, items, access_token, journal=None, workers=None, deadline=None,\
+               client=None, rebuild=None):
+    """
+    Calls ``post(access_token=access_token, deadline=deadline, client=client, **item)``
+    for every item dict on a pool of ``workers`` threads.
+
+    With a ``journal``, items an earlier run has already posted are not sent
+    again and ``rebuild(item, id)`` (required then) stands in for their
+    result; items sent by a run which stopped before getting the answer
+    give PostInDoubt. Items rejected by Eviscape, or which never reached it
+    (no connection, circuit open, deadline hit before sending), are sent
+    again on the next run.
+    """
+    if journal is not None and rebuild is None:
+        raise TypeError("_post_many() needs rebuild with a journal")
+    def send(item):
+        if journal is None:
+            return post(access_token=access_token, deadline=deadline, client=client, **item)
+        key = make_key(item)
+        status = journal.claim(key)
+        if status == 'done':
+            return rebuild(item, journal.result(key))
+        if status == 'in_doubt':
+            raise PostInDoubt("Post %s may already exist, not sent again" % key)
+        try:
+            result = post(access_token=access_token, deadline=deadline, client=client, **item)
+        except EviscapeError:
+            journal.fail(key)
+            raise
+        except HTTPError, e:
+            if not e.request_sent:
+                journal.fail(key)
+            raise
+        journal.finish(key, result.id)
+        return result
+    return _get_many(send, items, workers, client)
+
+def paginate(method, *args, **kwargs):
+    """
+    Iterate over the items of every page of a listing method
+    Usage: for e in paginate(Evis.sent, Nodes(id=17)): print e
+           for n in paginate(Nodes(id=17).listeners, per_page=50, prefetch=4): print n
+    Returns: A Generator with the objects of page ``page`` (default 1) onwards
+
+    While the caller consumes one page, up to ``prefetch`` following pages
+    are already being fetched on background threads. Iteration stops at the
+    first page holding less than ``per_page`` items (which defaults to the
+    method's own default).
+    """
+    prefetch = max(kwargs.pop('prefetch', 2), 0)
+    page = kwargs.pop('page', 1)
+    if 'per_page' not in kwargs:
+        names, varargs, varkw, defaults = inspect.getargspec(method)
+        defaults = dict(zip(names[-len(defaults or ()):], defaults or ()))
+        kwargs['per_page'] = defaults.get('per_page', 10)
+    per_page = kwargs['per_page']
+    
+    def fetch(page):
+        return list(method(*args, **dict(kwargs, page=page)) or [])
+    
+    jobs = deque()
+    while True:
+        while len(jobs) <= prefetch:
+            jobs.append(Job(fetch, page).start())
+            page += 1
+        items = jobs.popleft().result()
+        for item in items:
+            yield item
+        if len(items) < per_page:
+            break
+    
+
 def _handle_member_xml(data):
-    "Handles xml data object for member"
-    members = []
-    if data.rsp.objects.__dict__.has_key('members'):
-        if isinstance(data.rsp.objects.members, list):
-            for m in data.rsp.objects.members:
-                members.append(_parse_member(m))
-        else:
-            members = [_parse_member(data.rsp.objects.members)]
-    return members
+    "Handles xml records for member"
+    return [_parse_member(m) for tag, m in data if tag == 'members']
 
 def _handle_node_xml(data):
-    "Handles xml data for nodes"
-    nodes = []
-    if data.rsp.objects.__dict__.has_key('node'):
-        if isinstance(data.rsp.objects.node, list):
-            for n in data.rsp.objects.node:
-                nodes.append(_parse_node(n))
-        else:
-            nodes = [_parse_node(data.rsp.objects.node)]
-    return nodes
+    "Handles xml records for nodes"
+    return [_parse_node(n) for tag, n in data if tag == 'node']
 
 def _handle_evis_xml(data):
-    "Handles xml data for evis"
-    evis = []
-    if data.rsp.objects.__dict__.has_key('evis'):
-        if isinstance(data.rsp.objects.evis, list):
-            for evi in data.rsp.objects.evis:
-                evis.append(_parse_evis(evi))
-        else:
-             evis = [_parse_evis(data.rsp.objects.evis)]
+    "Handles xml records for evis"
+    evis = [_parse_evis(evi) for tag, evi in data if tag == 'evis']
+    if evis:
         return evis
     return None
 
 def _handle_comment_xml(data):
-    comments = []
-    if data.rsp.objects.__dict__.has_key('comment'):
-        if isinstance(data.rsp.objects.comment, list):
-            for c in data.rsp.objects.comment:
-                comments.append(_parse_comment(c))
-        else:
-            comments = [_parse_comment(data.rsp.objects.comment)]
-    return comments
+    "Handles xml records for comments"
+    return [_parse_comment(c) for tag, c in data if tag == 'comment']
 
 def _handle_comment_json(data):
     comment = []
@@ -602,14 +793,8 @@ def _handle_evis_json(data):
     return evis
 
 def _handle_file_xml(data):
-    files=[]
-    if data.rsp.objects.__dict__.has_key('files'):
-        if isinstance(data.rsp.objects.files, list):
-            for fle in data.rsp.objects.files:
-                files.append(_parse_file(fle))
-        else:
-            files = [_parse_file(data.rsp.objects.files)]
-    return files
+    "Handles xml records for files"
+    return [_parse_file(fle) for tag, fle in data if tag == 'files']
 
 def _handle_file_json(data):
     "Handles json data for file"
@@ -704,73 +889,56 @@ def _parse_comment_json(c):
                     comment.get('ecm_insert_date', None))
     
 def _parse_member(member):
-    "Parse member response"
-    if hasattr(member, 'mem_pen_name') and hasattr(member.mem_pen_name, 'text'):
-        mem_pen_name = member.mem_pen_name.text
-    else:
-        mem_pen_name = None
-    if hasattr(member, 'nod_id_primary'):
-        n = Nodes(int(member.nod_id_primary.text))
+    "Parse member record"
+    if member.has_key('nod_id_primary'):
+        n = Nodes(int(member['nod_id_primary']))
     else:
         n = None
-    m = Members(member.id,\
-                member.mem_name.text,\
-                member.mem_full_name.text,\
-                mem_pen_name,\
+    m = Members(member.get('id', None),\
+                member.get('mem_name', None),\
+                member.get('mem_full_name', None),\
+                member.get('mem_pen_name', None),\
                 n)
     return m
 
 def _parse_node(node):
-    "Parse Node response"
-    if hasattr(node, 'nod_logo_image'):
-        logo = node.nod_logo_image.text
-    else:
-        logo = None
-    if hasattr(node, 'nod_desc'):
-        desc = node.nod_desc.text
-    else:
-        desc = None
-    
-    if hasattr(node, 'nod_listener_count'):
-        count = node.nod_listener_count
-    else:
-        count = None
-    if hasattr(node, 'mem_id'):
-        m = Members(int(node.mem_id.text))
+    "Parse Node record"
+    if node.has_key('mem_id'):
+        m = Members(int(node['mem_id']))
     else:
         m = None
-    n = Nodes(node.id, node.nod_name.text, m, node.ref, node.nod_strict.text,\
-          logo, desc, count)
+    n = Nodes(node.get('id', None),\
+              node.get('nod_name', None),\
+              m,\
+              node.get('ref', None),\
+              node.get('nod_strict', None),\
+              node.get('nod_logo_image', None),\
+              node.get('nod_desc', None),\
+              node.get('nod_listener_count', None))
     return n
 
 def _parse_evis(evis, reverse_type_id=True):
-    "Parse Evis response"
-    m = Members(int(evis.mem_id.text))
-    n = Nodes(int(evis.nod_id.text))
-    evi = Evis(evis.id, n, m, evis.evi_subject.text, evis.evi_body.text,\
-             evis.type.text, evis.evi_comment_count.text, parseDateTime(evis.evi_insert_date.text), evis.ref,\
+    "Parse Evis record"
+    m = Members(int(evis['mem_id']))
+    n = Nodes(int(evis['nod_id']))
+    evi = Evis(evis.get('id', None), n, m, evis.get('evi_subject', None),\
+             evis.get('evi_body', None), evis.get('type', None),\
+             evis.get('evi_comment_count', None),\
+             parseDateTime(evis.get('evi_insert_date', None)), evis.get('ref', None),\
              reverse_type_id=reverse_type_id)
     return evi
 
 def _parse_file(file):
-    "Parse file response"
-    if not file.ref.startswith('http'):
-        ref = "http://www.eviscape.com%s" % file.ref
-    else:
-        ref = file.ref
-    fle = Files(file.id, file.fle_title.text, ref)
+    "Parse file record"
+    ref = file.get('ref', '')
+    if not ref.startswith('http'):
+        ref = "http://www.eviscape.com%s" % ref
+    fle = Files(file.get('id', None), file.get('fle_title', None), ref)
     return fle
 
 def _parse_comment(comment):
-    "Parse comment response"
-    n = Nodes(int(comment.nod_id.text))
-    if not hasattr(comment, 'ecm_insert_date'):
-        ecm_insert_date = ""
-    else:
-        ecm_insert_date = comment.ecm_insert_date.text
-    if hasattr(comment, 'mem_pen_name') and hasattr(comment.mem_pen_name, 'text'):
-        comm = Comments(comment.id, n, comment.ecm_comment.text, comment.mem_pen_name.text,\
-                        ecm_insert_date)
-    else:
-        comm = Comments(comment.id, n, comment.ecm_comment.text, None,ecm_insert_date)
-    return comm
\ No newline at end of file
+    "Parse comment record"
+    n = Nodes(int(comment['nod_id']))
+    comm = Comments(comment.get('id', None), n, comment.get('ecm_comment', None),\
+                    comment.get('mem_pen_name', None), comment.get('ecm_insert_date', ""))
+    return comm
@@ -0,0 +1,138 @@
+"""
+Eviscape API wrapper
+Author: Deepak Thukral<deepak@musicpictures.com>
+Durable journal of bulk writes, so an interrupted import can be resumed.
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import threading
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from utils import EviscapeError, smart_str
+
+
+class PostInDoubt(EviscapeError):
+    """
+    A post was sent by an earlier run which stopped before its outcome was
+    recorded; it may or may not exist on Eviscape, so it is not sent again.
+    """
+    pass
+
+
+def make_key(params):
+    """
+    Identifies a post by its parameters (objects stand for their id), so
+    the same input produces the same keys on every run
+    """
+    items = []
+    for k, v in params.items():
+        if hasattr(v, 'id'):
+            v = v.id
+        items.append((k, smart_str(v)))
+    items.sort()
+    return sha1(repr(items)).hexdigest()
+
+
+class Journal(object):
+    """
+    Append-only file recording every post of a bulk write as it is started
+    and once it is done (with the id Eviscape gave it), synced to disk
+    before the post goes out and right after it returns.
+
+    Reopening the journal of an interrupted run tells which posts already
+    exist (done), which never got an answer (in doubt) and which are still
+    to be sent. Posts rejected by Eviscape are recorded as failed and are
+    sent again on the next run.
+
+    Usage: journal = Journal('import.journal'); Evis.post_many(items, token, journal=journal)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # key -> result id of the finished posts
+        self.done = {}
+        # keys of posts started but never finished
+        self.pending = set()
+        if os.path.exists(path):
+            self._load()
+        self.file = open(path, 'a')
+
+    def _load(self):
+        f = open(self.path, 'r')
+        try:
+            for line in f:
+                # a line cut short by a crash is ignored
+                if not line.endswith('\n'):
+                    break
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                if parts[0] == 'S':
+                    self.pending.add(parts[1])
+                elif parts[0] == 'D' and len(parts) == 3:
+                    self.pending.discard(parts[1])
+                    self.done[parts[1]] = parts[2]
+                elif parts[0] == 'F':
+                    self.pending.discard(parts[1])
+        finally:
+            f.close()
+
+    def _write(self, line):
+        self.file.write(line + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def status(self, key):
+        "'done', 'in_doubt' or None if the post has not been sent yet"
+        if key in self.done:
+            return 'done'
+        if key in self.pending:
+            return 'in_doubt'
+        return None
+
+    def result(self, key):
+        "The id Eviscape returned for a finished post"
+        return self.done.get(key)
+
+    def claim(self, key):
+        """
+        Returns the status of the post and, if it has not been sent yet,
+        records it as started (atomically, so duplicates are sent once)
+        """
+        self.lock.acquire()
+        try:
+            status = self.status(key)
+            if status is None:
+                self._write('S %s' % key)
+                self.pending.add(key)
+            return status
+        finally:
+            self.lock.release()
+
+    def finish(self, key, result_id):
+        self.lock.acquire()
+        try:
+            self._write('D %s %s' % (key, result_id))
+            self.pending.discard(key)
+            self.done[key] = str(result_id)
+        finally:
+            self.lock.release()
+
+    def fail(self, key):
+        self.lock.acquire()
+        try:
+            self._write('F %s' % key)
+            self.pending.discard(key)
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.file.close()
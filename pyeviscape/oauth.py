@@ -3,13 +3,21 @@ The MIT License
 Copyright (c) 2007 Leah Culver
 """
 
+import os
 import cgi
+import array
 import urllib
 import time
 import random
 import urlparse
 import hmac
 import binascii
+import threading
+
+try:
+    from hashlib import sha1 # 2.5
+except ImportError:
+    import sha as sha1 # deprecated
 
 VERSION = '1.0' # Hi Blaine!
 HTTP_METHOD = 'GET'
@@ -29,15 +37,62 @@ def escape(s):
     # escape '/' too
     return urllib.quote(s, safe='~')
 
+# url escape of parameter names, which are few, so memoized
+_escaped_names = {}
+def escape_name(name):
+    escaped = _escaped_names.get(name)
+    if escaped is None:
+        escaped = escape(str(name))
+        if len(_escaped_names) >= 1000:
+            _escaped_names.clear()
+        _escaped_names[name] = escaped
+    return escaped
+
+# strips the query and fragment of a url, which are not part of the
+# normalized url (a cheap first step before normalize_http_url)
+def base_url(url):
+    return url.split('?', 1)[0].split('#', 1)[0]
+
+# parses the url and rebuilds it to be scheme://host/path; the same few
+# API urls are signed over and over (with varying queries), so the results
+# are memoized per url without its query
+_normalized_urls = {}
+def normalize_http_url(url):
+    url = base_url(url)
+    url_string = _normalized_urls.get(url)
+    if url_string is None:
+        parts = urlparse.urlparse(url)
+        url_string = '%s://%s%s' % (parts[0], parts[1], parts[2]) # scheme, netloc, path
+        if len(_normalized_urls) >= 1000:
+            _normalized_urls.clear()
+        _normalized_urls[url] = url_string
+    return url_string
+
 # util function: current timestamp
 # seconds since epoch (UTC)
 def generate_timestamp():
     return int(time.time())
 
 # util function: nonce
-# pseudorandom number
+# random hex digits, cut from a per-thread buffer filled from os.urandom
+# in bulk; a forked child drops the buffer it inherited so that it does not
+# repeat the nonces of its parent
+NONCE_ENTROPY = 4096 # bytes drawn at a time
+_nonce_buffer = threading.local()
 def generate_nonce(length=40):
-    return ''.join([str(random.randint(0, 9)) for i in range(length)])
+    state = _nonce_buffer
+    pid = os.getpid()
+    if getattr(state, 'pid', None) != pid or state.pos + length > len(state.digits):
+        try:
+            entropy = os.urandom(max(NONCE_ENTROPY, (length + 1) // 2))
+        except NotImplementedError:
+            return ''.join([str(random.randint(0, 9)) for i in range(length)])
+        state.digits = binascii.hexlify(entropy)
+        state.pos = 0
+        state.pid = pid
+    pos = state.pos
+    state.pos = pos + length
+    return state.digits[pos:pos + length]
 
 # OAuthConsumer is a data type that represents the identity of the Consumer
 # via its shared secret with the Service Provider.
@@ -100,7 +155,20 @@ class OAuthRequest(object):
     def __init__(self, http_method=HTTP_METHOD, http_url=None, parameters=None):
         self.http_method = http_method
         self.http_url = http_url
-        self.parameters = parameters or {}
+        # a copy, signing must not touch the dict of the caller
+        self.parameters = dict(parameters or {})
+        # parameter -> (value, escaped key, escaped value, escaped pair
+        # escaped again for the base string), so signing and serializing the
+        # request again only escapes the values which changed
+        self._escaped = {}
+        self._sorted_keys = []
+
+    # use (and fill) escaped, the cache of earlier requests of the same kind
+    # (see __init__), so signing this one only escapes the values which
+    # differ, e.g. the page, nonce and timestamp of the next page of a crawl;
+    # entries are checked against the values, so it can be shared by threads
+    def share_escaped(self, escaped):
+        self._escaped = escaped
 
     def set_parameter(self, parameter, value):
         self.parameters[parameter] = value
@@ -114,6 +182,43 @@ class OAuthRequest(object):
     def _get_timestamp_nonce(self):
         return self.get_parameter('oauth_timestamp'), self.get_parameter('oauth_nonce')
 
+    # the parameter names sorted lexicographically, re-sorted only when
+    # parameters were added or removed
+    def _get_sorted_keys(self):
+        keys = self._sorted_keys
+        params = self.parameters
+        if len(keys) != len(params) or [k for k in keys if k not in params]:
+            keys = params.keys()
+            keys.sort()
+            self._sorted_keys = keys
+        return keys
+
+    # -> the cache entry of a parameter (see __init__), escaped again only
+    # when its value changed
+    def _get_escaped(self, k):
+        v = self.parameters[k]
+        cached = self._escaped.get(k)
+        if cached is None or type(cached[0]) is not type(v) or cached[0] != v:
+            if cached is None:
+                key = escape_name(k)
+            else:
+                key = cached[1]
+            value = escape(str(v))
+            # escaped strings only hold unreserved characters and %XX, so
+            # escaping them again only has to escape the '%'
+            pair = '%s%%3D%s' % (key.replace('%', '%25'), value.replace('%', '%25'))
+            cached = (v, key, value, pair)
+            self._escaped[k] = cached
+        return cached
+
+    # escaped 'key=value' strings of the parameters whose names pass test
+    def _get_escaped_pairs(self, test=None):
+        pairs = []
+        for k in self._get_sorted_keys():
+            if test is None or test(k):
+                pairs.append('%s=%s' % self._get_escaped(k)[1:3])
+        return pairs
+
     # get any non-oauth parameters
     def get_nonoauth_parameters(self):
         parameters = {}
@@ -127,32 +232,35 @@ class OAuthRequest(object):
     def to_header(self, realm=''):
         auth_header = 'OAuth realm="%s"' % realm
         # add the oauth parameters
-        if self.parameters:
-            for k, v in self.parameters.iteritems():
-                if k[:6] == 'oauth_':
-                    auth_header += ', %s="%s"' % (k, escape(str(v)))
+        for k in self._get_sorted_keys():
+            if k[:6] == 'oauth_':
+                auth_header += ', %s="%s"' % (k, self._get_escaped(k)[2])
         return {'Authorization': auth_header}
 
     # serialize as post data for a POST request
     def to_postdata(self):
-        return '&'.join(['%s=%s' % (escape(str(k)), escape(str(v))) for k, v in self.parameters.iteritems()])
+        return '&'.join(self._get_escaped_pairs())
     # serialize as a url for a GET request
     def to_url(self):
         return '%s?%s' % (self.get_normalized_http_url(), self.to_postdata())
 
+    # serialize the non-oauth parameters as a url for a GET request whose
+    # oauth parameters go in the header (see to_header); sorted, so the same
+    # call always gets the same url
+    def to_nonoauth_url(self):
+        query = '&'.join(self._get_escaped_pairs(lambda k: k.find('oauth_') < 0))
+        return '%s?%s' % (self.get_normalized_http_url(), query)
+
     # return a string that consists of all the parameters that need to be signed
     def get_normalized_parameters(self):
-        params = self.parameters
-        try:
-            # exclude the signature if it exists
-            del params['oauth_signature']
-        except:
-            pass
-        key_values = params.items()
-        # sort lexicographically, first after key, then after value
-        key_values.sort()
-        # combine key value pairs in string and escape
-        return '&'.join(['%s=%s' % (escape(str(k)), escape(str(v))) for k, v in key_values])
+        # sorted lexicographically after key (keys are unique), escaped and
+        # without the signature if it exists
+        return '&'.join(self._get_escaped_pairs(lambda k: k != 'oauth_signature'))
+
+    # the normalized parameters escaped once more, as they appear in the
+    # signature base string; same as escape(get_normalized_parameters())
+    def get_escaped_normalized_parameters(self):
+        return '%26'.join([self._get_escaped(k)[3] for k in self._get_sorted_keys() if k != 'oauth_signature'])
 
     # just uppercases the http method
     def get_normalized_http_method(self):
@@ -160,9 +268,7 @@ class OAuthRequest(object):
 
     # parses the url and rebuilds it to be scheme://host/path
     def get_normalized_http_url(self):
-        parts = urlparse.urlparse(self.http_url)
-        url_string = '%s://%s%s' % (parts[0], parts[1], parts[2]) # scheme, netloc, path
-        return url_string
+        return normalize_http_url(self.http_url)
         
     # set the signature parameter to the result of build_signature
     def sign_request(self, signature_method, consumer, token):
@@ -286,7 +392,7 @@ class OAuthServer(object):
         self.signature_methods = signature_methods or {}
 
     def set_data_store(self, oauth_data_store):
-        self.data_store = data_store
+        self.data_store = oauth_data_store
 
     def get_data_store(self):
         return self.data_store
@@ -389,7 +495,6 @@ class OAuthServer(object):
     def _check_signature(self, oauth_request, consumer, token):
         timestamp, nonce = oauth_request._get_timestamp_nonce()
         self._check_timestamp(timestamp)
-        self._check_nonce(consumer, token, nonce)
         signature_method = self._get_signature_method(oauth_request)
         try:
             signature = oauth_request.get_parameter('oauth_signature')
@@ -400,19 +505,22 @@ class OAuthServer(object):
         if not valid_sig:
             key, base = signature_method.build_signature_base_string(oauth_request, consumer, token)
             raise OAuthError('Invalid signature. Expected signature base string: %s' % base)
-        built = signature_method.build_signature(oauth_request, consumer, token)
+        # only now, so that forged requests cannot use up (or fill the data
+        # store with) nonces
+        self._check_nonce(consumer, token, nonce, timestamp)
 
     def _check_timestamp(self, timestamp):
-        # verify that timestamp is recentish
+        # verify that timestamp is recentish (and not far in the future, which
+        # would keep the nonce valid longer than a data store remembers it)
         timestamp = int(timestamp)
         now = int(time.time())
         lapsed = now - timestamp
-        if lapsed > self.timestamp_threshold:
+        if abs(lapsed) > self.timestamp_threshold:
             raise OAuthError('Expired timestamp: given %d and now %s has a greater difference than threshold %d' % (timestamp, now, self.timestamp_threshold))
 
-    def _check_nonce(self, consumer, token, nonce):
+    def _check_nonce(self, consumer, token, nonce, timestamp):
         # verify that the nonce is uniqueish
-        nonce = self.data_store.lookup_nonce(consumer, token, nonce)
+        nonce = self.data_store.lookup_nonce(consumer, token, nonce, timestamp)
         if nonce:
             raise OAuthError('Nonce already used: %s' % str(nonce))
 
@@ -450,12 +558,12 @@ class OAuthDataStore(object):
         # -> OAuthConsumer
         raise NotImplementedError
 
-    def lookup_token(self, oauth_consumer, token_type, token_token):
+    def lookup_token(self, token_type, token_token):
         # -> OAuthToken
         raise NotImplementedError
 
     def lookup_nonce(self, oauth_consumer, oauth_token, nonce, timestamp):
-        # -> OAuthToken
+        # -> the nonce if it was used before, records it otherwise
         raise NotImplementedError
 
     def fetch_request_token(self, oauth_consumer):
@@ -470,6 +578,153 @@ class OAuthDataStore(object):
         # -> OAuthToken
         raise NotImplementedError
 
+# BloomFilter is a set of keys which uses a fixed number of bits, but may
+# wrongly claim to hold a string it was never given (more often as it fills)
+class BloomFilter(object):
+
+    def __init__(self, bits=1 << 20, hashes=4):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = array.array('B', [0]) * ((bits + 7) // 8)
+
+    # -> True if key may have been added before, adds it either way
+    def add(self, key):
+        h1 = hash(key)
+        h2 = (h1 >> 16) | 1
+        cells = self.array
+        seen = True
+        for i in xrange(self.hashes):
+            bit = (h1 + i * h2) % self.bits
+            mask = 1 << (bit & 7)
+            if not cells[bit >> 3] & mask:
+                cells[bit >> 3] |= mask
+                seen = False
+        return seen
+
+# MemoryDataStore is an OAuthDataStore keeping consumers, tokens and nonces in
+# memory, safe to share between the threads of a server
+class MemoryDataStore(OAuthDataStore):
+    '''
+    timestamp_threshold = the one of the OAuthServer; a nonce is remembered
+        as long as its timestamp passes the server's check, then forgotten
+    buckets = nonces expire per time bucket, threshold / buckets seconds long
+    bloom_bits = remember the nonces of each bucket in a Bloom filter of that
+        many bits instead of a set: memory per bucket is fixed, but a new
+        nonce is now and then taken for a replay and its request rejected.
+        With n nonces in a bucket that happens to about
+        (1 - exp(-bloom_hashes * n / bloom_bits)) ** bloom_hashes of the
+        requests: with 1 << 20 bits and 4 hashes, 1 in 500,000 at 10,000
+        nonces, 1 in 1,100 at 50,000 and 1 in 100 at 100,000
+    '''
+
+    def __init__(self, timestamp_threshold=OAuthServer.timestamp_threshold, buckets=10, bloom_bits=0, bloom_hashes=4):
+        self.timestamp_threshold = timestamp_threshold
+        self.bucket_width = max(1, timestamp_threshold // buckets)
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.lock = threading.Lock()
+        # key -> OAuthConsumer
+        self.consumers = {}
+        # (token type, key) -> OAuthToken
+        self.tokens = {}
+        # request token key -> user it was authorized by
+        self.authorized = {}
+        # bucket -> set of (consumer key, token key, timestamp, nonce)
+        self.nonces = {}
+        # bucket -> BloomFilter of the nonces (with bloom_bits, instead of nonces)
+        self.blooms = {}
+        self.oldest_bucket = None
+
+    def add_consumer(self, consumer):
+        self.consumers[consumer.key] = consumer
+        return consumer
+
+    def add_token(self, token, token_type='access'):
+        self.tokens[(token_type, token.key)] = token
+        return token
+
+    def lookup_consumer(self, key):
+        return self.consumers.get(key)
+
+    def lookup_token(self, token_type, token_token):
+        return self.tokens.get((token_type, token_token))
+
+    # nonces are unique per consumer, token and timestamp; a replay has the
+    # timestamp of the original (it is signed), so finds it in the same
+    # bucket, which is kept until that timestamp is too old for the server
+    def lookup_nonce(self, oauth_consumer, oauth_token, nonce, timestamp):
+        timestamp = int(timestamp)
+        token_key = oauth_token and oauth_token.key or ''
+        key = (oauth_consumer.key, token_key, timestamp, nonce)
+        bucket = (timestamp + self.timestamp_threshold) // self.bucket_width
+        self.lock.acquire()
+        try:
+            self._expire_nonces(int(time.time()) // self.bucket_width)
+            if self.bloom_bits:
+                seen = self._add_bloom(bucket, key)
+            else:
+                seen = self._add_nonce(bucket, key)
+            if seen:
+                return nonce
+            return None
+        finally:
+            self.lock.release()
+
+    # -> True if key is already in the bucket, adds it otherwise
+    def _add_nonce(self, bucket, key):
+        keys = self.nonces.get(bucket)
+        if keys is None:
+            keys = self.nonces[bucket] = set()
+            if self.oldest_bucket is None or bucket < self.oldest_bucket:
+                self.oldest_bucket = bucket
+        elif key in keys:
+            return True
+        keys.add(key)
+        return False
+
+    # -> True if key may be in the bucket's Bloom filter, adds it either way
+    def _add_bloom(self, bucket, key):
+        bloom = self.blooms.get(bucket)
+        if bloom is None:
+            bloom = self.blooms[bucket] = BloomFilter(self.bloom_bits, self.bloom_hashes)
+            if self.oldest_bucket is None or bucket < self.oldest_bucket:
+                self.oldest_bucket = bucket
+        return bloom.add(key)
+
+    # drops the buckets whose timestamps are all out of the threshold
+    def _expire_nonces(self, current):
+        if self.oldest_bucket is None or self.oldest_bucket >= current:
+            return
+        if self.bloom_bits:
+            buckets = self.blooms
+        else:
+            buckets = self.nonces
+        for bucket in buckets.keys():
+            if bucket < current:
+                del buckets[bucket]
+        if buckets:
+            self.oldest_bucket = min(buckets)
+        else:
+            self.oldest_bucket = None
+
+    def fetch_request_token(self, oauth_consumer):
+        return self.add_token(OAuthToken(generate_nonce(32), generate_nonce(32)), 'request')
+
+    def fetch_access_token(self, oauth_consumer, oauth_token):
+        self.lock.acquire()
+        try:
+            if oauth_token.key not in self.authorized:
+                raise OAuthError('Request token not authorized: %s' % oauth_token.key)
+            del self.authorized[oauth_token.key]
+            self.tokens.pop(('request', oauth_token.key), None)
+        finally:
+            self.lock.release()
+        return self.add_token(OAuthToken(generate_nonce(32), generate_nonce(32)), 'access')
+
+    def authorize_request_token(self, oauth_token, user):
+        self.authorized[oauth_token.key] = user
+        return oauth_token
+
 # OAuthSignatureMethod is a strategy class that implements a signature method
 class OAuthSignatureMethod(object):
     def get_name(self):
@@ -489,33 +744,55 @@ class OAuthSignatureMethod(object):
         return built == signature
 
 class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
+    # the hmac keyed with the secrets of a (consumer, token) pair, and the
+    # escaped 'METHOD&url&' start of the base string of a (method, url), are
+    # computed once and reused; each cache is emptied when it reaches this
+    max_cached = 1000
+
+    def __init__(self):
+        self._keyed = {}
+        self._prefixes = {}
 
     def get_name(self):
         return 'HMAC-SHA1'
-        
-    def build_signature_base_string(self, oauth_request, consumer, token):
-        sig = (
-            escape(oauth_request.get_normalized_http_method()),
-            escape(oauth_request.get_normalized_http_url()),
-            escape(oauth_request.get_normalized_parameters()),
-        )
+
+    def _get_key(self, consumer, token):
         key = '%s&' % escape(consumer.secret)
         if token:
             key += escape(token.secret)
-        raw = '&'.join(sig)
-        return key, raw
+        return key
+
+    def _get_prefix(self, oauth_request):
+        # -> str 'METHOD&url&', both escaped
+        cache_key = (oauth_request.http_method, base_url(oauth_request.http_url))
+        prefix = self._prefixes.get(cache_key)
+        if prefix is None:
+            prefix = '%s&%s&' % (escape(oauth_request.get_normalized_http_method()),
+                                 escape(oauth_request.get_normalized_http_url()))
+            if len(self._prefixes) >= self.max_cached:
+                self._prefixes.clear()
+            self._prefixes[cache_key] = prefix
+        return prefix
+
+    def _get_hmac(self, consumer, token):
+        # -> fresh hmac keyed for the pair, copied from the cached one
+        cache_key = (consumer.secret, token and token.secret)
+        keyed = self._keyed.get(cache_key)
+        if keyed is None:
+            keyed = hmac.new(self._get_key(consumer, token), None, sha1)
+            if len(self._keyed) >= self.max_cached:
+                self._keyed.clear()
+            self._keyed[cache_key] = keyed
+        return keyed.copy()
 
-    def build_signature(self, oauth_request, consumer, token):
-        # build the base signature string
-        key, raw = self.build_signature_base_string(oauth_request, consumer, token)
+    def build_signature_base_string(self, oauth_request, consumer, token):
+        raw = self._get_prefix(oauth_request) + oauth_request.get_escaped_normalized_parameters()
+        return self._get_key(consumer, token), raw
 
-        # hmac object
-        try:
-            import hashlib # 2.5
-            hashed = hmac.new(key, raw, hashlib.sha1)
-        except:
-            import sha # deprecated
-            hashed = hmac.new(key, raw, sha)
+    def build_signature(self, oauth_request, consumer, token):
+        hashed = self._get_hmac(consumer, token)
+        hashed.update(self._get_prefix(oauth_request))
+        hashed.update(oauth_request.get_escaped_normalized_parameters())
 
         # calculate the digest base 64
         return binascii.b2a_base64(hashed.digest())[:-1]
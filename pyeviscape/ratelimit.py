@@ -0,0 +1,211 @@
+"""
+Eviscape API wrapper
+Author: Deepak Thukral<deepak@musicpictures.com>
+Token bucket rate limiting of the API calls.
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TokenBucket(object):
+    """
+    Allows ``rate`` calls per second on average and bursts of up to
+    ``burst`` calls, for the threads of one process.
+
+    A call takes its token right away even if the bucket is empty, running
+    the balance negative; it then waits until the balance would have been
+    refilled. Waiting callers are thus spaced evenly instead of all waking
+    up at once when tokens come back.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def _take(self, tokens, now, updated, count, max_wait=None):
+        """
+        Returns the new (tokens, updated) state and the seconds to wait; the
+        wait is None and the state unchanged if it would exceed ``max_wait``
+        """
+        left = min(self.burst, tokens + (now - updated) * self.rate) - count
+        delay = max(-left / self.rate, 0.0)
+        if max_wait is not None and delay > max_wait:
+            return tokens, updated, None
+        return left, now, delay
+
+    def reserve(self, count=1, max_wait=None):
+        """
+        Takes ``count`` tokens, returns the seconds to wait before using them.
+        If that would be more than ``max_wait`` seconds, nothing is taken and
+        None is returned.
+        """
+        self.lock.acquire()
+        try:
+            self.tokens, self.updated, delay = self._take(self.tokens, time.time(),
+                                                          self.updated, count, max_wait)
+            return delay
+        finally:
+            self.lock.release()
+
+    def give_back(self, count=1):
+        "Returns ``count`` tokens reserved but not used"
+        self.lock.acquire()
+        try:
+            self.tokens = min(self.burst, self.tokens + count)
+        finally:
+            self.lock.release()
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    TokenBucket whose state lives in the file ``path``, locked with fcntl,
+    so that all the processes on a machine using the same path share one
+    budget. Not available where fcntl is not (Windows).
+    """
+    FORMAT = '!dd'
+
+    def __init__(self, path, rate, burst=None):
+        if fcntl is None:
+            raise NotImplementedError("FileTokenBucket requires fcntl")
+        TokenBucket.__init__(self, rate, burst)
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0666)
+
+    def _update(self, update):
+        "Replaces the (tokens, updated) state in the file with ``update(tokens, updated, now)``"
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                os.lseek(self.fd, 0, 0)
+                state = os.read(self.fd, struct.calcsize(self.FORMAT))
+                now = time.time()
+                if len(state) == struct.calcsize(self.FORMAT):
+                    tokens, updated = struct.unpack(self.FORMAT, state)
+                else:
+                    tokens, updated = self.burst, now
+                tokens, updated, result = update(tokens, updated, now)
+                os.lseek(self.fd, 0, 0)
+                os.write(self.fd, struct.pack(self.FORMAT, tokens, updated))
+                return result
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        finally:
+            self.lock.release()
+
+    def reserve(self, count=1, max_wait=None):
+        return self._update(lambda tokens, updated, now: self._take(tokens, now, updated, count, max_wait))
+
+    def give_back(self, count=1):
+        self._update(lambda tokens, updated, now: (min(self.burst, tokens + count), updated, None))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class RateLimiter(object):
+    """
+    Paces API calls with a global bucket and optional per-method buckets;
+    a call waits for both.
+
+    ``rate``/``burst`` set the global budget (None: unlimited), ``methods``
+    maps API methods to their own (rate, burst). With ``path`` the buckets
+    are FileTokenBucket files named after it, shared by every process
+    using the same path.
+
+    Usage: utils.rate_limiter = RateLimiter(5, burst=10, methods={'evis.post': (1, 2)})
+           utils.rate_limiter = RateLimiter(5, path='/tmp/eviscape.ratelimit')
+    """
+    def __init__(self, rate=None, burst=None, methods=None, path=None):
+        self.path = path
+        self.buckets = {}
+        if rate is not None:
+            self.buckets[None] = self._make_bucket('global', rate, burst)
+        for method, (method_rate, method_burst) in (methods or {}).items():
+            self.buckets[method] = self._make_bucket(method, method_rate, method_burst)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.delayed = 0
+        # calls refused because they would have waited too long
+        self.refused = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # method -> [calls, delayed, total_wait]
+        self.method_stats = {}
+
+    def _make_bucket(self, name, rate, burst):
+        if self.path is None:
+            return TokenBucket(rate, burst)
+        return FileTokenBucket('%s.%s' % (self.path, name), rate, burst)
+
+    def reserve(self, method, max_wait=None):
+        """
+        Takes a token for ``method``, returns the seconds to wait for it. If
+        that would be more than ``max_wait`` seconds, no token is taken and
+        None is returned.
+        """
+        delay = 0.0
+        taken = []
+        for key in (method, None):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket_delay = bucket.reserve(max_wait=max_wait)
+                if bucket_delay is None:
+                    for bucket in taken:
+                        bucket.give_back()
+                    self.lock.acquire()
+                    try:
+                        self.refused += 1
+                    finally:
+                        self.lock.release()
+                    return None
+                taken.append(bucket)
+                delay = max(delay, bucket_delay)
+        self.lock.acquire()
+        try:
+            self.calls += 1
+            stats = self.method_stats.setdefault(method, [0, 0, 0.0])
+            stats[0] += 1
+            if delay > 0:
+                self.delayed += 1
+                self.total_wait += delay
+                self.max_wait = max(self.max_wait, delay)
+                stats[1] += 1
+                stats[2] += delay
+        finally:
+            self.lock.release()
+        return delay
+
+    def wait(self, method, timeout=None):
+        """
+        Blocks until a call to ``method`` is allowed, returns the seconds
+        waited. Returns None at once (taking no token) if that would be more
+        than ``timeout`` seconds.
+        """
+        delay = self.reserve(method, timeout)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def stats(self):
+        methods = {}
+        for method, (calls, delayed, total_wait) in self.method_stats.items():
+            methods[method] = {'calls': calls, 'delayed': delayed, 'total_wait': total_wait}
+        return {'calls': self.calls, 'delayed': self.delayed, 'refused': self.refused,
+                'total_wait': self.total_wait, 'max_wait': self.max_wait,
+                'mean_wait': self.calls and self.total_wait / self.calls,
+                'methods': methods}
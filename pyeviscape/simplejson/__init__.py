@@ -102,16 +102,16 @@ is a subset of YAML, so it may be used as a serializer for that as well.
 __version__ = '1.9.2'
 __all__ = [
     'dump', 'dumps', 'load', 'loads',
-    'JSONDecoder', 'JSONEncoder',
+    'JSONDecoder', 'JSONStreamDecoder', 'JSONEncoder',
 ]
 
 if __name__ == '__main__':
     import warnings
     warnings.warn('python -msimplejson is deprecated, use python -msiplejson.tool', DeprecationWarning)
-    from decoder import JSONDecoder
+    from decoder import JSONDecoder, JSONStreamDecoder
     from encoder import JSONEncoder
 else:
-    from decoder import JSONDecoder
+    from decoder import JSONDecoder, JSONStreamDecoder
     from encoder import JSONEncoder
 
 _default_encoder = JSONEncoder(
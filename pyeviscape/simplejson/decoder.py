@@ -340,4 +340,193 @@ class JSONDecoder(object):
             raise ValueError("No JSON object could be decoded")
         return obj, end
 
-__all__ = ['JSONDecoder']
+class _Incomplete(Exception):
+    "Raised internally when the buffer ends before the next JSON value."
+    pass
+
+
+NUMBER_CHARS = '.eE+-0123456789'
+
+class JSONStreamDecoder(JSONDecoder):
+    """
+    Incremental decoder for a JSON object with one (potentially large)
+    array member, such as ``{"stat": "ok", "objects": [...]}``.
+
+    Data is fed in chunks as it arrives; every element of the ``key`` array
+    is decoded with the regular scanner as soon as it is complete and handed
+    back to the caller, so the whole document never has to be buffered.
+    All other members of the top-level object are collected in
+    ``envelope``.
+
+    >>> decoder = JSONStreamDecoder('objects')
+    >>> decoder.feed('{"stat": "ok", "objects": [{"id": 1}, {"i')
+    [{u'id': 1}]
+    >>> decoder.feed('d": 2}]}')
+    [{u'id': 2}]
+    >>> decoder.close()
+    []
+    >>> decoder.envelope
+    {u'stat': u'ok'}
+    """
+
+    # parser states
+    (START, FIRST_KEY, KEY, COLON, VALUE, FIRST_ITEM, ITEM, ITEM_DELIMITER,
+     DELIMITER, DONE) = range(10)
+
+    def __init__(self, key='objects', **kw):
+        JSONDecoder.__init__(self, **kw)
+        self.key = key
+        self.envelope = {}
+        self.buf = ''
+        self.pos = 0
+        self.state = self.START
+        self.current_key = None
+        self.closed = False
+
+    def _value(self, _w=WHITESPACE.match):
+        """
+        Decode the value at the current position, raising ``_Incomplete``
+        when more data is required to tell where it ends.
+        """
+        s = self.buf
+        try:
+            value, end = self._scanner.iterscan(s, idx=self.pos, context=self).next()
+        except StopIteration:
+            if not self.closed:
+                raise _Incomplete
+            raise ValueError(errmsg("Expecting object", s, self.pos))
+        except (ValueError, IndexError):
+            if not self.closed:
+                raise _Incomplete
+            raise
+        # a number or constant at the very end of the buffer may continue
+        # in the next chunk, also when the scanner stopped before a '.',
+        # an exponent or its sign which the rest of the number follows
+        if not self.closed and s[end - 1] not in '}]"':
+            if _w(s, end).end() == len(s) or not s[end:].strip(NUMBER_CHARS):
+                raise _Incomplete
+        self.pos = end
+        return value
+
+    def _char(self, _w=WHITESPACE.match):
+        "Skip whitespace and return the next character (or raise)."
+        self.pos = _w(self.buf, self.pos).end()
+        c = self.buf[self.pos:self.pos + 1]
+        if not c:
+            if not self.closed:
+                raise _Incomplete
+            raise ValueError(errmsg("Unexpected end of data", self.buf, self.pos))
+        return c
+
+    def _step(self):
+        "Advance the state machine by one token, returning a finished item."
+        state = self.state
+        s = self.buf
+        if state == self.START:
+            if self._char() != '{':
+                raise ValueError(errmsg("Expecting object", s, self.pos))
+            self.pos += 1
+            self.state = self.FIRST_KEY
+        elif state == self.FIRST_KEY:
+            if self._char() == '}':
+                self.pos += 1
+                self.state = self.DONE
+            else:
+                self.state = self.KEY
+        elif state == self.KEY:
+            if self._char() != '"':
+                raise ValueError(errmsg("Expecting property name", s, self.pos))
+            try:
+                self.current_key, end = scanstring(s, self.pos + 1,
+                                                   self.encoding, self.strict)
+            except ValueError:
+                if not self.closed:
+                    raise _Incomplete
+                raise
+            self.pos = end
+            self.state = self.COLON
+        elif state == self.COLON:
+            if self._char() != ':':
+                raise ValueError(errmsg("Expecting : delimiter", s, self.pos))
+            self.pos += 1
+            self.state = self.VALUE
+        elif state == self.VALUE:
+            if self._char() == '[' and self.current_key == self.key:
+                self.pos += 1
+                self.state = self.FIRST_ITEM
+            else:
+                self.envelope[self.current_key] = self._value()
+                self.state = self.DELIMITER
+        elif state == self.FIRST_ITEM:
+            if self._char() == ']':
+                self.pos += 1
+                self.state = self.DELIMITER
+            else:
+                self.state = self.ITEM
+        elif state == self.ITEM:
+            self._char()
+            item = self._value()
+            self.state = self.ITEM_DELIMITER
+            return [item]
+        elif state == self.ITEM_DELIMITER:
+            c = self._char()
+            if c == ']':
+                self.state = self.DELIMITER
+            elif c == ',':
+                self.state = self.ITEM
+            else:
+                raise ValueError(errmsg("Expecting , delimiter", s, self.pos))
+            self.pos += 1
+        elif state == self.DELIMITER:
+            c = self._char()
+            if c == '}':
+                self.state = self.DONE
+            elif c == ',':
+                self.state = self.KEY
+            else:
+                raise ValueError(errmsg("Expecting , delimiter", s, self.pos))
+            self.pos += 1
+        return []
+
+    def feed(self, data):
+        """
+        Add ``data`` to the buffer and return the list of array elements
+        which could be completed with it.
+        """
+        if self.pos:
+            # drop everything that was already decoded
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += data
+        items = []
+        try:
+            while self.state != self.DONE:
+                items.extend(self._step())
+        except _Incomplete:
+            pass
+        return items
+
+    def close(self, _w=WHITESPACE.match):
+        """
+        Signal the end of the data, returning any remaining elements.
+        Raises ``ValueError`` if the document is truncated or malformed.
+        """
+        self.closed = True
+        items = self.feed('')
+        end = _w(self.buf, self.pos).end()
+        if end != len(self.buf):
+            raise ValueError(errmsg("Extra data", self.buf, end, len(self.buf)))
+        return items
+
+    def iterdecode(self, chunks):
+        """
+        Yield the elements of the ``key`` array from an iterable of string
+        chunks as soon as each one is complete.
+        """
+        for chunk in chunks:
+            for item in self.feed(chunk):
+                yield item
+        for item in self.close():
+            yield item
+
+__all__ = ['JSONDecoder', 'JSONStreamDecoder']
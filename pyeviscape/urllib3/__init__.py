@@ -1,5 +1,8 @@
-from connectionpool import HTTPConnectionPool
+from connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from poolmanager import PoolManager
 from filepost import encode_multipart_formdata
+from retry import Retry, CircuitBreaker
 
 # Possible exceptions
-from connectionpool import HTTPError, MaxRetryError, TimeoutError
+from connectionpool import HTTPError, MaxRetryError, TimeoutError, DecodeError, EmptyPoolError, CircuitOpenError, \
+     DeadlineExceeded
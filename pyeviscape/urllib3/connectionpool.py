@@ -1,22 +1,36 @@
 import logging
+import os
+import zlib
 log = logging.getLogger(__name__)
 
+import threading
+import time
+import select
 from Queue import Queue, Empty, Full
 from StringIO import StringIO
 from itertools import count
 
 from urllib import urlencode
-from httplib import HTTPConnection, HTTPException
+from httplib import HTTPConnection, HTTPSConnection, HTTPException
 from socket import error as SocketError, timeout as SocketTimeout
 
 
 from filepost import encode_multipart_formdata
+from retry import Retry, CircuitBreaker
 
 ## Exceptions
 
 class HTTPError(Exception):
     "Base exception used by this module."
-    pass
+    # False when urlopen raised it before the request was written to any
+    # connection (not connected, circuit open, no free connection, deadline
+    # hit before sending): the server cannot have acted on it
+    request_sent = True
+
+def _sent(e, sent):
+    "Returns ``e`` telling whether its request may have reached the server"
+    e.request_sent = sent
+    return e
 
 class MaxRetryError(HTTPError):
     "Raised when the maximum number of retries is exceeded."
@@ -26,37 +40,205 @@ class TimeoutError(HTTPError):
     "Raised when a socket timeout occurs."
     pass
 
+class DeadlineExceeded(TimeoutError):
+    "Raised when a request (with its retries and redirects) runs out of time."
+    pass
+
+class EmptyPoolError(HTTPError):
+    "Raised when a blocking pool has no free connection within pool_timeout."
+    pass
+
+class CircuitOpenError(HTTPError):
+    "Raised without sending a request while a host's circuit breaker is open."
+    pass
+
+class DecodeError(HTTPError):
+    "Raised when a compressed response body cannot be decoded."
+    pass
+
+## Content decoding
+
+class DeflateDecoder(object):
+    """
+    Decoder for 'deflate' bodies, which servers send either zlib-wrapped
+    (as the RFC says) or as a raw deflate stream.
+    """
+    def __init__(self):
+        self._obj = zlib.decompressobj()
+        self._data = ''
+
+    def decompress(self, data):
+        if self._data is None:
+            return self._obj.decompress(data)
+        self._data += data
+        try:
+            result = self._obj.decompress(data)
+        except zlib.error:
+            # not zlib-wrapped, start over as a raw stream
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            data, self._data = self._data, None
+            return self._obj.decompress(data)
+        if result:
+            self._data = None
+        return result
+
+    def flush(self):
+        return self._obj.flush()
+
+def get_decoder(content_encoding):
+    """
+    Return an incremental decoder (with ``decompress`` and ``flush``) for
+    the given Content-Encoding, or None if the body is not encoded.
+    """
+    content_encoding = (content_encoding or '').strip().lower()
+    if content_encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == 'deflate':
+        return DeflateDecoder()
+    return None
+
+def is_readable(sock):
+    """
+    Whether ``sock`` has data, an error or a hang-up pending, without
+    waiting. Uses poll when the platform has it, as select only takes
+    descriptors below FD_SETSIZE; when it must fall back to select for
+    such a descriptor, the socket is taken as not readable.
+    """
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN | select.POLLHUP | select.POLLERR)
+        return bool(poller.poll(0))
+    try:
+        return bool(select.select([sock], [], [], 0.0)[0])
+    except ValueError:
+        return False
+
 ## Response objects
 
 class HTTPResponse(object):
     """
     HTTP Response container.
 
-    Similar to httplib's HTTPResponse but the data is pre-loaded.
+    Similar to httplib's HTTPResponse but the data is pre-loaded, unless it
+    was created with ``preload_content=False``: then the body is read on
+    demand with read(amt) or by iterating over the response, and the
+    connection is handed back to its pool once the body has been drained or
+    the response is closed. gzip and deflate encoded bodies are decoded.
     """
-    def __init__(self, data='', headers={}, status=0, version=0, reason=None, strict=0):
-        self.data = data
+    CHUNK_SIZE = 8192
+
+    def __init__(self, data='', headers={}, status=0, version=0, reason=None, strict=0,
+                 original_response=None, pool=None, connection=None, decode_content=True):
+        self._body = data
         self.headers = headers
         self.status = status
         self.version = version
         self.reason = reason
         self.strict = strict
+        self._fp = original_response
+        self._pool = pool
+        self._connection = connection
+        self._decoder = None
+        if decode_content:
+            self._decoder = get_decoder(headers.get('content-encoding'))
+        if original_response is not None:
+            self._body = None
 
     @staticmethod
-    def from_httplib(r):
+    def from_httplib(r, decode_content=True, preload_content=True, **response_kw):
         """
         Given an httplib.HTTPResponse instance, return a corresponding
         urllib3.HTTPResponse object.
 
-        NOTE: This method will perform r.read() which will have side effects
-        on the original http.HTTPResponse object.
+        If ``decode_content`` is set, a gzip or deflate encoded body is
+        decompressed chunk by chunk while it is read. Extra keyword
+        arguments (``pool``, ``connection``) are passed to the constructor.
+
+        NOTE: Unless ``preload_content`` is False, this method will perform
+        r.read() which will have side effects on the original
+        http.HTTPResponse object.
         """
-        return HTTPResponse(data=r.read(),
-                    headers=dict(r.getheaders()),
+        response = HTTPResponse(headers=dict(r.getheaders()),
                     status=r.status,
                     version=r.version,
                     reason=r.reason,
-                    strict=r.strict)
+                    strict=r.strict,
+                    original_response=r,
+                    decode_content=decode_content,
+                    **response_kw)
+        if preload_content:
+            response._body = response.read()
+        return response
+
+    @property
+    def data(self):
+        "The whole (remaining) body, read on first access if not preloaded"
+        if self._body is None:
+            self._body = self.read()
+        return self._body
+
+    def read(self, amt=None):
+        """
+        Read and return (decoded) data from the body: everything left if
+        ``amt`` is None, otherwise what decodes from up to ``amt`` bytes.
+        An empty string means the body is exhausted.
+        """
+        if self._fp is None:
+            return ''
+        try:
+            while True:
+                if amt is None:
+                    raw = self._fp.read()
+                else:
+                    raw = self._fp.read(amt)
+                if self._decoder is None:
+                    data = raw
+                else:
+                    data = self._decoder.decompress(raw)
+                    if not raw or amt is None:
+                        data += self._decoder.flush()
+                if not raw or amt is None:
+                    self._release_conn()
+                    return data
+                if data:
+                    return data
+        except zlib.error, e:
+            self.close()
+            raise DecodeError("Received response with content-encoding: %s, but failed to decode it: %s" % (self.headers.get('content-encoding'), e))
+        except:
+            self.close()
+            raise
+
+    def stream(self, amt=CHUNK_SIZE):
+        "Yield the body in pieces decoded from up to ``amt`` bytes each"
+        while True:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def __iter__(self):
+        return self.stream()
+
+    def _release_conn(self):
+        "Give the connection back to its pool (only once)"
+        self._fp = None
+        if self._pool is not None and self._connection is not None:
+            self._pool._put_conn(self._connection)
+        self._pool = self._connection = None
+
+    def close(self):
+        """
+        Stop reading the body. A connection with unread data on it cannot
+        be reused, so it is closed before going back to the pool (it will
+        reconnect on its next request).
+        """
+        if self._fp is None:
+            return
+        self._fp.close()
+        if self._connection is not None:
+            self._connection.close()
+        self._release_conn()
 
     # Backwards-compatibility methods for httplib.HTTPResponse
     def getheaders(self):
@@ -76,16 +258,90 @@ class HTTPConnectionPool(object):
     All requests made to this object must belong to the same host as defined
     in the instantiation of this object in ``host``. If you need many hosts,
     make one instance per host.
-    Socket request timeout will be set to ``timeout`` for each individual query.
+    Establishing a connection may take up to ``connect_timeout`` seconds
+    (default: ``timeout``), waiting for each read of the response up to
+    ``timeout`` seconds; None waits forever.
+    If ``compress`` is set, gzip/deflate encoding is requested for every
+    response (unless the caller sends its own Accept-Encoding header).
+
+    With ``block`` set, no more than ``maxsize`` connections are ever open:
+    a request waits up to ``pool_timeout`` seconds (forever if None) for a
+    connection to be released, then raises EmptyPoolError.
+
+    Pooled connections are checked before reuse: one the server has closed,
+    one idle for more than ``max_idle`` seconds or one opened more than
+    ``max_lifetime`` seconds ago is closed and replaced. reap() does the
+    same for all idle connections at once.
+
+    ``retries`` is the default number of retries or Retry policy of
+    urlopen. With ``failure_threshold`` set, a CircuitBreaker refuses
+    requests for ``recovery_timeout`` seconds after that many consecutive
+    failures, raising CircuitOpenError.
+
+    The pool is fork safe: a child process never reuses the connections of
+    its parent, it starts over with an empty pool (see reset_after_fork).
     """
-    def __init__(self, host, port=80, timeout=None, maxsize=10):
-        self.pool = Queue(maxsize)
+    scheme = 'http'
+    ConnectionCls = HTTPConnection
+    def __init__(self, host, port=80, timeout=None, maxsize=10, compress=False,
+                 block=False, pool_timeout=None, max_idle=None, max_lifetime=None,
+                 retries=3, failure_threshold=None, recovery_timeout=30,
+                 connect_timeout=None):
+        self.maxsize = maxsize
         self.host = host
         self.port = int(port)
         self.timeout = timeout
+        if connect_timeout is None:
+            connect_timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.compress = compress
+        self.block = block
+        self.pool_timeout = pool_timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._init_state()
+
+    def _init_state(self):
+        "Empty queue, fresh locks and counters, owned by the current process"
+        self.pid = os.getpid()
+        self.pool = Queue(self.maxsize)
+        self.breaker = None
+        if self.failure_threshold:
+            self.breaker = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
         self.num_connections = count()
         self.num_requests = count()
 
+        # gauges, see stats()
+        self.lock = threading.Lock()
+        self.num_in_use = 0
+        self.num_idle = 0
+        self.num_created = 0
+        self.num_discarded = 0
+        self.num_reaped = 0
+
+        if self.block:
+            # every None is a permit to open a new connection
+            for i in xrange(self.maxsize):
+                self.pool.put(None)
+
+    def reset_after_fork(self):
+        """
+        Forget the connections, locks and counters inherited from the parent
+        process; call it in a freshly forked worker. It is done anyway on
+        the first request made in a new process, this just does it early.
+        The inherited sockets are left alone (not even closed) so the
+        parent can keep using them.
+        """
+        self._init_state()
+
+    def _check_pid(self):
+        if self.pid != os.getpid():
+            log.info("Process forked, resetting HTTP connection pool: %s" % self.host)
+            self.reset_after_fork()
+
     @staticmethod
     def get_host(url):
         """
@@ -102,6 +358,8 @@ class HTTPConnectionPool(object):
         port = 80
         if '//' in url:
             scheme, url = url.split('//', 1)
+            if scheme.lower() == 'https:':
+                port = 443
         if '/' in url:
             url, path = url.split('/', 1)
         if ':' in url:
@@ -110,41 +368,212 @@ class HTTPConnectionPool(object):
         return url, port
 
     @staticmethod
-    def from_url(url, timeout=None, maxsize=10):
+    def from_url(url, **kw):
         """
         Given a url, return an HTTPConnectionPool instance of its host.
 
         This is a shortcut for not having to determine the host of the url
-        before creating an HTTPConnectionPool instance.
+        before creating an HTTPConnectionPool instance. Keyword arguments
+        are passed on to the pool.
         """
         host, port = HTTPConnectionPool.get_host(url)
-        return HTTPConnectionPool(host, port=port, timeout=timeout, maxsize=maxsize)
+        return HTTPConnectionPool(host, port=port, **kw)
 
-    def _get_conn(self):
+    def _is_expired(self, conn, now):
+        """
+        Whether an idle connection must not be reused: it was idle or open
+        for too long, or the server closed it (its socket is readable, as
+        the server has nothing to send between requests).
+        """
+        if self.max_idle is not None and now - conn.pool_last_used > self.max_idle:
+            return True
+        if self.max_lifetime is not None and now - conn.pool_created > self.max_lifetime:
+            return True
+        if conn.sock is None:
+            # not connected, it will connect on its next request
+            return False
+        try:
+            return is_readable(conn.sock)
+        except (SocketError, select.error):
+            return True
+
+    def _discard_expired(self, conn):
+        "Close an expired idle connection, counting it as reaped"
+        conn.close()
+        self.lock.acquire()
+        try:
+            self.num_idle -= 1
+            self.num_reaped += 1
+        finally:
+            self.lock.release()
+
+    def _get_conn(self, timeout=None):
         """
         Get a connection. Will return a pooled connection if one is available.
-        Otherwise, a fresh connection is returned.
+        Otherwise, a fresh connection is returned, unless the pool blocks and
+        all ``maxsize`` connections are in use: then we wait for one, up to
+        ``timeout`` seconds (default: pool_timeout).
         """
+        self._check_pid()
+        if timeout is None:
+            timeout = self.pool_timeout
         try:
-            conn = self.pool.get(block=False)
+            conn = self.pool.get(block=self.block, timeout=timeout)
         except Empty, e:
+            if self.block:
+                raise EmptyPoolError("Pool reached maximum size and no connection was released within %s seconds: %s" % (timeout, self.host))
+            conn = None
+        if conn is not None and self._is_expired(conn, time.time()):
+            log.info("Dropping stale HTTP connection: %s" % self.host)
+            self._discard_expired(conn)
+            conn = None
+        self.lock.acquire()
+        try:
+            self.num_in_use += 1
+            if conn is not None:
+                self.num_idle -= 1
+            else:
+                self.num_created += 1
+        finally:
+            self.lock.release()
+        if conn is None:
             log.info("Starting new HTTP connection (%d): %s" % (self.num_connections.next(), self.host))
-            conn = HTTPConnection(host=self.host, port=self.port)
+            conn = self.ConnectionCls(host=self.host, port=self.port)
+            conn.pool_created = time.time()
+            conn.pool_pid = self.pid
         return conn
 
     def _put_conn(self, conn):
         """
-        Put a connection back into the pool.
+        Put a connection back into the pool. None releases the slot of a
+        connection which was closed after an error.
         If the pool is already full, the connection is discarded because we
         exceeded maxsize. If connections are discarded frequently, then maxsize
-        should be increased.
+        should be increased (or the pool made blocking).
         """
+        if conn is not None and getattr(conn, 'pool_pid', self.pid) != self.pid:
+            # checked out before a fork; its socket is shared with the
+            # other process, so it must not be reused (nor closed)
+            return
+        if conn is not None:
+            conn.pool_last_used = time.time()
+        self.lock.acquire()
+        try:
+            self.num_in_use -= 1
+            if conn is not None:
+                self.num_idle += 1
+        finally:
+            self.lock.release()
+        if conn is None and not self.block:
+            return
         try:
             self.pool.put(conn, block=False)
         except Full, e:
             log.warning("HttpConnectionPool is full, discarding connection: %s" % self.host)
+            conn.close()
+            self.lock.acquire()
+            try:
+                self.num_idle -= 1
+                self.num_discarded += 1
+            finally:
+                self.lock.release()
+
+    def reap(self):
+        """
+        Close all idle connections which are expired or were closed by the
+        server, so the next requests do not run into them. Call it
+        periodically (e.g. from a timer thread) after quiet periods.
+        Returns the number of connections closed.
+        """
+        self._check_pid()
+        now = time.time()
+        reaped = 0
+        for i in xrange(self.pool.qsize()):
+            try:
+                conn = self.pool.get(block=False)
+            except Empty:
+                break
+            if conn is not None and self._is_expired(conn, now):
+                self._discard_expired(conn)
+                reaped += 1
+                conn = None
+                if not self.block:
+                    continue
+            try:
+                self.pool.put(conn, block=False)
+            except Full:
+                if conn is not None:
+                    conn.close()
+        return reaped
+
+    def close(self):
+        """
+        Close all idle connections. Connections in use are not affected.
+        """
+        self._check_pid()
+        while True:
+            try:
+                conn = self.pool.get(block=False)
+            except Empty:
+                break
+            if conn is not None:
+                conn.close()
+                self.lock.acquire()
+                try:
+                    self.num_idle -= 1
+                finally:
+                    self.lock.release()
+        if self.block:
+            for i in xrange(self.maxsize - self.num_in_use):
+                try:
+                    self.pool.put(None, block=False)
+                except Full:
+                    break
+
+    def stats(self):
+        """
+        Gauges of the pool: connections in use and idle in the pool, and
+        how many were created, discarded (pool full) and reaped (expired or
+        closed by the server) since the pool was made, plus the state of the
+        circuit breaker.
+        """
+        return {'in_use': self.num_in_use, 'idle': self.num_idle,
+                'created': self.num_created, 'discarded': self.num_discarded,
+                'reaped': self.num_reaped, 'maxsize': self.maxsize,
+                'breaker': self.breaker and self.breaker.stats()}
+
+    def _record(self, ok):
+        "Tell the circuit breaker (if any) how a request went"
+        if self.breaker is not None:
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
 
-    def urlopen(self, method, url, body=None, headers={}, retries=3, redirect=True):
+    @staticmethod
+    def _cap(timeout, end):
+        "``timeout`` shortened to the time left before ``end`` (if any)"
+        if end is None:
+            return timeout
+        left = max(end - time.time(), 0.001)
+        if timeout is None:
+            return left
+        return min(timeout, left)
+
+    def _backoff(self, retries, response, end):
+        """
+        Wait before the next attempt. Returns False (without waiting) if the
+        wait would go past ``end``.
+        """
+        delay = retries.get_delay(response)
+        if end is not None and time.time() + delay >= end:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def urlopen(self, method, url, body=None, headers={}, retries=None, redirect=True,
+                preload_content=True, deadline=None):
         """
         Get a connection from the pool and perform an HTTP request.
 
@@ -159,44 +588,139 @@ class HTTPConnectionPool(object):
             Custom headers to send (such as User-Agent, If-None-Match, etc.)
 
         retries
-            Number of retries to allow before raising a MaxRetryError exception.
+            Number of retries, or a Retry policy (default: the pool's
+            ``retries``). A MaxRetryError is raised when they are exhausted
+            by connection errors; a response with a retried status is
+            returned as is when they are exhausted.
 
         redirect
             Automatically handle redirects (status codes 301, 302, 303, 307),
             each redirect counts as a retry.
-        """
-        if retries < 0:
-            raise MaxRetryError("Max retries exceeded for url: %s" % url)
 
-        conn = self._get_conn()
+        preload_content
+            If False, the body is not read here: the returned response must
+            be read (or iterated) until exhausted, or closed, which puts the
+            connection back into the pool.
 
-        # Make the request
-        try:
-            self.num_requests.next()
-            conn.request(method, url, body=body, headers=headers)
-            conn.sock.settimeout(self.timeout)
-            httplib_response = conn.getresponse()
-
-            # from_httplib will perform httplib_response.read() which will have
-            # the side effect of letting us use this connection for another
-            # request.
-            response = HTTPResponse.from_httplib(httplib_response)
-
-            self._put_conn(conn)
-        except (SocketTimeout), e:
-            raise TimeoutError("Connection timed out after %f seconds" % self.timeout)
-        except (HTTPException, SocketError), e:
-            log.warn("Retrying (%d attempts remain) after connection broken by '%r': %s" % (retries, e, url))
-            return self.urlopen(method, url, body, headers, retries-1, redirect) # Try again
-
-        # Handle redirection
-        if redirect and response.status in [301, 302, 303, 307] and 'location' in response.headers: # Redirect, retry
-            log.info("Redirecting %s -> %s" % (url, response.headers.get('location')))
-            return self.urlopen(method, response.headers.get('location'), body, headers, retries-1, redirect)
+        deadline
+            Seconds the whole call may take, including waiting for a pooled
+            connection, retries, backoff and redirects. Every timeout is
+            shortened to fit it; DeadlineExceeded is raised when it runs out.
+            (Reading a body which is not preloaded is only bounded by the
+            read timeout.)
 
-        return response
-
-    def get_url(self, url, fields={}, headers={}, retries=3, redirect=True):
+        An HTTPError raised before the request was written to a connection
+        has ``request_sent`` False, so even a POST can safely be sent again.
+        """
+        # before anything else: a forked child must not go by the breaker
+        # (or the connections) of its parent
+        self._check_pid()
+
+        end = None
+        if deadline is not None:
+            end = time.time() + deadline
+
+        if retries is None:
+            retries = self.retries
+        retries = Retry.from_int(retries)
+
+        if self.compress and 'accept-encoding' not in [h.lower() for h in headers]:
+            headers = dict(headers)
+            headers['Accept-Encoding'] = 'gzip, deflate'
+
+        # whether the request was written (maybe partly) to a connection yet
+        sent = False
+        while True:
+            if retries.is_exhausted():
+                raise _sent(MaxRetryError("Max retries exceeded for url: %s" % url), sent)
+            if end is not None and time.time() >= end:
+                raise _sent(DeadlineExceeded("Deadline of %s seconds exceeded for url: %s" % (deadline, url)), sent)
+            if self.breaker is not None and not self.breaker.allow():
+                raise _sent(CircuitOpenError("Circuit open for %s, request not sent: %s" % (self.host, url)), sent)
+
+            try:
+                conn = self._get_conn(self._cap(self.pool_timeout, end))
+            except EmptyPoolError, e:
+                if self.breaker is not None:
+                    self.breaker.cancel()
+                raise _sent(e, sent)
+            # until the connection is back in the pool or handed to the response
+            owned = True
+            connected = False
+            read_timeout = self._cap(self.timeout, end)
+
+            # Make the request
+            try:
+                if conn.sock is None:
+                    conn.timeout = self._cap(self.connect_timeout, end)
+                    conn.connect()
+                connected = True
+                conn.sock.settimeout(read_timeout)
+                self.num_requests.next()
+                sent = True
+                conn.request(method, url, body=body, headers=headers)
+                httplib_response = conn.getresponse()
+
+                if preload_content:
+                    # from_httplib will perform httplib_response.read() which will
+                    # have the side effect of letting us use this connection for
+                    # another request.
+                    response = HTTPResponse.from_httplib(httplib_response)
+                    owned = False
+                    self._put_conn(conn)
+                else:
+                    # the response puts the connection back once it is drained
+                    response = HTTPResponse.from_httplib(httplib_response,
+                                                         preload_content=False,
+                                                         pool=self, connection=conn)
+                    owned = False
+            except (HTTPException, SocketError), e:
+                conn.close()
+                self._put_conn(None)
+                self._record(False)
+                if connected and isinstance(e, SocketTimeout):
+                    raise TimeoutError("Read timed out after %s seconds: %s" % (read_timeout, url))
+                if connected and not retries.is_idempotent(method):
+                    # the server may have acted on it, sending it again is not safe
+                    raise
+                retries = retries.increment()
+                if not retries.is_exhausted():
+                    log.warn("Retrying (%d attempts remain) after connection broken by '%r': %s" % (retries.total, e, url))
+                    if not self._backoff(retries, None, end):
+                        raise _sent(DeadlineExceeded("Deadline of %s seconds exceeded for url: %s" % (deadline, url)), sent)
+                continue # Try again
+            except:
+                # anything else (a body failing to decode, ...) must not
+                # keep the connection's slot taken
+                if owned:
+                    conn.close()
+                    self._put_conn(None)
+                self._record(False)
+                raise
+
+            self._record(response.status < 500)
+
+            # Handle redirection
+            if redirect and response.status in [301, 302, 303, 307] and 'location' in response.headers: # Redirect, retry
+                log.info("Redirecting %s -> %s" % (url, response.headers.get('location')))
+                response.close()
+                url = response.headers.get('location')
+                retries = retries.increment()
+                continue
+
+            # Retry overloaded or failing servers
+            if retries.is_retry(method, response.status):
+                next_retries = retries.increment()
+                if self._backoff(next_retries, response, end):
+                    log.warn("Retrying (%d attempts remain) after status %d: %s" % (next_retries.total, response.status, url))
+                    response.close()
+                    retries = next_retries
+                    continue
+
+            return response
+
+    def get_url(self, url, fields={}, headers={}, retries=None, redirect=True, preload_content=True,
+                deadline=None):
         """
         Wrapper for performing GET with urlopen (see urlopen for more details).
 
@@ -205,9 +729,10 @@ class HTTPConnectionPool(object):
         """
         if fields:
             url += '?' + urlencode(fields)
-        return self.urlopen('GET', url, headers=headers, retries=retries, redirect=redirect)
+        return self.urlopen('GET', url, headers=headers, retries=retries, redirect=redirect,
+                            preload_content=preload_content, deadline=deadline)
 
-    def post_url(self, url, fields={}, headers={}, retries=3, redirect=True):
+    def post_url(self, url, fields={}, headers={}, retries=None, redirect=True):
         """
         Wrapper for performing POST with urlopen (see urlopen for more details).
 
@@ -226,3 +751,14 @@ class HTTPConnectionPool(object):
         body, content_type = encode_multipart_formdata(fields)
         headers.update({'Content-Type': content_type})
         return self.urlopen('POST', url, body, headers=headers, retries=retries, redirect=redirect)
+
+
+class HTTPSConnectionPool(HTTPConnectionPool):
+    """
+    Same as HTTPConnectionPool, but connections use SSL.
+    """
+    scheme = 'https'
+    ConnectionCls = HTTPSConnection
+
+    def __init__(self, host, port=443, *args, **kwargs):
+        HTTPConnectionPool.__init__(self, host, port, *args, **kwargs)
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import urlparse
+
+from connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+log = logging.getLogger(__name__)
+
+
+pool_classes_by_scheme = {
+    'http': HTTPConnectionPool,
+    'https': HTTPSConnectionPool,
+}
+
+port_by_scheme = {
+    'http': 80,
+    'https': 443,
+}
+
+
+class PoolManager(object):
+    """
+    Allows for arbitrary requests while transparently keeping track of
+    necessary connection pools for you.
+
+    One pool is kept per (scheme, host, port). Up to ``num_pools`` pools are
+    kept around; beyond that the least recently used pool which has no
+    connection in use is closed and dropped.
+
+    Additional keyword arguments (``maxsize``, ``compress``, ``block``, ...)
+    are used to create every new pool.
+
+    Like the pools, the manager resets itself in a forked child process.
+
+    Example:
+    >>> manager = PoolManager(num_pools=2)
+    >>> r = manager.get_url('http://www.eviscape.com/')
+    """
+    def __init__(self, num_pools=10, **connection_pool_kw):
+        self.num_pools = num_pools
+        self.connection_pool_kw = connection_pool_kw
+        self.pools = {}
+        # pool keys, least recently used first
+        self.recent = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def reset_after_fork(self):
+        """
+        Reset the lock and every pool after a fork (see
+        HTTPConnectionPool.reset_after_fork); the pools and their settings
+        are kept, only the inherited connections are dropped.
+        """
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        for pool in self.pools.values():
+            pool.reset_after_fork()
+
+    def connection_from_host(self, host, port=None, scheme='http'):
+        """
+        Get a HTTPConnectionPool based on the host, port and scheme.
+        """
+        scheme = scheme.lower()
+        port = port or port_by_scheme.get(scheme, 80)
+        pool_key = (scheme, host, port)
+
+        if self.pid != os.getpid():
+            self.reset_after_fork()
+
+        self.lock.acquire()
+        try:
+            pool = self.pools.get(pool_key)
+            if pool is None:
+                pool_cls = pool_classes_by_scheme[scheme]
+                pool = pool_cls(host, port, **self.connection_pool_kw)
+                self.pools[pool_key] = pool
+                self._evict()
+            else:
+                self.recent.remove(pool_key)
+            self.recent.append(pool_key)
+        finally:
+            self.lock.release()
+        return pool
+
+    def connection_from_url(self, url):
+        """
+        Similar to connection_from_host, but the host, port and scheme are
+        taken from ``url``.
+        """
+        parts = urlparse.urlsplit(url)
+        return self.connection_from_host(parts.hostname, parts.port, parts.scheme or 'http')
+
+    def _evict(self):
+        "Drop least recently used idle pools while there are too many"
+        for pool_key in list(self.recent):
+            if len(self.pools) <= self.num_pools:
+                break
+            pool = self.pools[pool_key]
+            if pool.num_in_use:
+                continue
+            log.info("Closing connection pool for %s://%s:%s" % pool_key)
+            pool.close()
+            del self.pools[pool_key]
+            self.recent.remove(pool_key)
+
+    def urlopen(self, method, url, **kw):
+        """
+        Same as HTTPConnectionPool.urlopen, with the pool chosen by ``url``.
+        """
+        return self.connection_from_url(url).urlopen(method, url, **kw)
+
+    def get_url(self, url, **kw):
+        "Same as HTTPConnectionPool.get_url, with the pool chosen by ``url``."
+        return self.connection_from_url(url).get_url(url, **kw)
+
+    def post_url(self, url, **kw):
+        "Same as HTTPConnectionPool.post_url, with the pool chosen by ``url``."
+        return self.connection_from_url(url).post_url(url, **kw)
+
+    def clear(self):
+        "Close and drop all pools"
+        self.lock.acquire()
+        try:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools = {}
+            self.recent = []
+        finally:
+            self.lock.release()
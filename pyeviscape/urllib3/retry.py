@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from rfc822 import parsedate_tz, mktime_tz
+
+log = logging.getLogger(__name__)
+
+
+class Retry(object):
+    """
+    Policy deciding whether and when a failed request is tried again.
+
+    total
+        Number of retries allowed (redirects count as retries too).
+
+    backoff_factor
+        The n-th retry waits backoff_factor * 2 ** (n - 1) seconds, at most
+        ``max_backoff``. 0 retries right away.
+
+    jitter
+        Fraction of the backoff which is randomized (0.5 waits between half
+        and all of it), so clients failing together do not retry together.
+
+    status_forcelist
+        Response statuses which are retried (by default overloaded or
+        failing servers: 429, 500, 502, 503 and 504).
+
+    method_whitelist
+        Methods which are safe to send again. Other methods (POST) are only
+        retried when the connection could not be established, that is when
+        the server cannot have seen the request.
+
+    respect_retry_after
+        Wait as long as a Retry-After header asks (up to ``max_backoff``)
+        instead of the computed backoff.
+
+    Retry objects are not modified by a request; increment() returns the
+    policy for the next attempt, so one instance can be shared by pools.
+
+    Example:
+    >>> pool = HTTPConnectionPool('www.eviscape.com', retries=Retry(5, backoff_factor=0.5))
+    """
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'])
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, total=3, backoff_factor=0, max_backoff=120, jitter=0.5,
+                 status_forcelist=RETRY_STATUSES, method_whitelist=IDEMPOTENT_METHODS,
+                 respect_retry_after=True, attempts=0):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_forcelist = status_forcelist
+        self.method_whitelist = method_whitelist
+        self.respect_retry_after = respect_retry_after
+        self.attempts = attempts
+
+    @classmethod
+    def from_int(cls, retries):
+        "Policy for a plain number of retries"
+        if isinstance(retries, cls):
+            return retries
+        return cls(total=retries)
+
+    def increment(self):
+        "Policy for the next attempt (check is_exhausted() before using it)"
+        return Retry(self.total - 1, self.backoff_factor, self.max_backoff, self.jitter,
+                     self.status_forcelist, self.method_whitelist,
+                     self.respect_retry_after, self.attempts + 1)
+
+    def is_exhausted(self):
+        return self.total < 0
+
+    def is_idempotent(self, method):
+        return method.upper() in self.method_whitelist
+
+    def is_retry(self, method, status):
+        "Whether a response with ``status`` should be retried"
+        return self.total > 0 and status in self.status_forcelist and self.is_idempotent(method)
+
+    def get_backoff(self):
+        "Seconds to wait before the next attempt"
+        if not self.backoff_factor or self.attempts < 1:
+            return 0
+        backoff = min(self.max_backoff, self.backoff_factor * (2 ** (self.attempts - 1)))
+        return backoff * (1 - self.jitter * random.random())
+
+    def get_retry_after(self, response):
+        "Seconds asked for by the Retry-After header of ``response``, or None"
+        value = response.getheader('retry-after')
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            seconds = int(value)
+        else:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            seconds = mktime_tz(date) - time.time()
+        return min(max(seconds, 0), self.max_backoff)
+
+    def get_delay(self, response=None):
+        "Seconds to wait before retrying (after ``response``, if any)"
+        delay = None
+        if response is not None and self.respect_retry_after:
+            delay = self.get_retry_after(response)
+        if delay is None:
+            delay = self.get_backoff()
+        return delay
+
+    def sleep(self, response=None):
+        "Waits before the next attempt"
+        delay = self.get_delay(response)
+        if delay > 0:
+            time.sleep(delay)
+
+    def __repr__(self):
+        return 'Retry(total=%r, attempts=%r)' % (self.total, self.attempts)
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests to a host fast while it is down.
+
+    After ``failure_threshold`` consecutive failures (connection errors,
+    timeouts, 5xx responses) the circuit opens: requests are refused
+    without touching the network for ``recovery_timeout`` seconds. Then a
+    single trial request is let through; its success closes the circuit,
+    its failure opens it for another ``recovery_timeout``. A trial which
+    is never recorded (it was not sent, see cancel()) does not block the
+    circuit: after ``recovery_timeout`` another one is let through.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+        self.num_rejected = 0
+        self.num_opened = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        "Whether a request may be sent now"
+        self.lock.acquire()
+        try:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if self.state == self.OPEN and now - self.opened_at >= self.recovery_timeout or \
+               self.state == self.HALF_OPEN and now - self.trial_at >= self.recovery_timeout:
+                # let one trial request through
+                self.state = self.HALF_OPEN
+                self.trial_at = now
+                return True
+            self.num_rejected += 1
+            return False
+        finally:
+            self.lock.release()
+
+    def cancel(self):
+        "The request let through by allow() was not sent after all"
+        self.lock.acquire()
+        try:
+            if self.state == self.HALF_OPEN:
+                # give the trial back, the next request may be it
+                self.state = self.OPEN
+        finally:
+            self.lock.release()
+
+    def record_success(self):
+        self.lock.acquire()
+        try:
+            self.failures = 0
+            self.state = self.CLOSED
+        finally:
+            self.lock.release()
+
+    def record_failure(self):
+        self.lock.acquire()
+        try:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log.warn("Circuit opened after %d failures" % self.failures)
+                    self.num_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.time()
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures,
+                'rejected': self.num_rejected, 'opened': self.num_opened}
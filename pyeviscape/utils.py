@@ -9,16 +9,18 @@ Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
 """
 
 import re
+import time
 from datetime import datetime, tzinfo, timedelta
-from xml.dom import minidom
-from urllib import urlencode, urlopen
+import _strptime # datetime.strptime imports it lazily, which is not thread safe
+from xml.parsers import expat
+from urllib import urlencode
 import urlparse
 import oauth
-from urllib3 import HTTPConnectionPool
+from urllib3 import PoolManager, Retry, DeadlineExceeded
+from workers import SingleFlight, JobTimeout
 from config import API_KEY, API_SECRET, FORMATTER
 
-if FORMATTER == 'json':
-    import simplejson
+import simplejson
 
 API_VERSION = '1.0'
 API_PROTOCOL = u'rest'
@@ -38,7 +40,32 @@ CONSUMER_SECRET = API_SECRET
 
 CONSUMER = oauth.OAuthConsumer(CONSUMER_KEY, CONSUMER_SECRET)
 
-http_pool = HTTPConnectionPool.from_url(API_URL)
+# seconds to establish a connection, and to wait for each read of a response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# one keep-alive connection pool per (scheme, host, port), shared by the
+# API, the OAuth endpoints and static files. Failed idempotent requests
+# are retried with exponential backoff; a host failing 5 times in a row is
+# not contacted again for 30 seconds.
+def make_pool_manager(**kw):
+    "A PoolManager with the defaults above, overridden by ``kw``"
+    options = dict(compress=True, retries=Retry(3, backoff_factor=0.5),
+                   failure_threshold=5, recovery_timeout=30,
+                   connect_timeout=CONNECT_TIMEOUT, timeout=READ_TIMEOUT)
+    options.update(kw)
+    return PoolManager(**options)
+
+pool_manager = make_pool_manager()
+http_pool = pool_manager.connection_from_url(API_URL)
+
+# signed requests carry the oauth parameters in the url (GET) or the form
+# body (POST); set to True to send them in an 'Authorization: OAuth ...'
+# header instead, which keeps the urls of protected GETs short and the same
+# for every call (so caching proxies can serve them)
+OAUTH_IN_HEADER = False
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
 
 
 class EviscapeError(Exception):
@@ -55,91 +82,118 @@ def request_oauth_resource(consumer, url, access_token, parameters=None, signatu
     oauth_request.sign_request(signature_method, consumer, access_token)
     return oauth_request
 
+def deadline_end(deadline):
+    "The time at which ``deadline`` seconds from now are over (None: no deadline)"
+    if deadline is None:
+        return None
+    return time.time() + deadline
+
+def time_left(end):
+    "Seconds left until ``end`` (None: no deadline)"
+    if end is None:
+        return None
+    return end - time.time()
+
+def post_oauth_request(oauth_request, params={}, in_header=None, deadline=None):
+    "See EviscapeClient.post_oauth_request"
+    return default_client.post_oauth_request(oauth_request, params, in_header, deadline)
+
+def get_oauth_request(oauth_request, in_header=None, **kw):
+    "See EviscapeClient.get_oauth_request"
+    return default_client.get_oauth_request(oauth_request, in_header, **kw)
+
 def fetch_urllib(oauth_request, params={}):
-    url = oauth_request.to_url()
-    if oauth_request.http_method == 'post':
-        a = http_pool.get_url(url, urlencode(params)).data
-    else:
-        a = http_pool.get_url(url).data
-    return a
+    return default_client.fetch_oauth(oauth_request, params)
+
+def fetch_url(url, **kw):
+    "GET any url (static files, permalinks, ...) through the pools, returns the body"
+    return default_client.fetch_url(url, **kw)
 
 def get_unauthorised_request_token(callback=None, consumer=CONSUMER, signature_method=signature_method):
     "Ask Eviscape OAuth server for a request_token"
-    oauth_request = oauth.OAuthRequest.from_consumer_and_token(
-        consumer, oauth_callback=callback, http_url=REQUEST_TOKEN_URL
-    )
-    oauth_request.sign_request(signature_method, consumer, None)
-    resp = fetch_urllib(oauth_request)
-    token = oauth.OAuthToken.from_string(resp)
-    return token
+    return default_client.get_request_token(callback, consumer, signature_method)
 
 
 def get_authorisation_url(token, perms='write', consumer=CONSUMER, signature_method=signature_method):
     "Ask Eviscape OAuth server for a authroization URL"
-    oauth_request = oauth.OAuthRequest.from_consumer_and_token(
-        consumer, perms=perms, token=token, http_url=AUTHORIZATION_URL
-    )
-    oauth_request.sign_request(signature_method, consumer, token)
-    return oauth_request.to_url()
+    return default_client.get_authorisation_url(token, perms, consumer, signature_method)
 
 def exchange_request_token_for_access_token(request_token, verifier, consumer=CONSUMER, signature_method=signature_method):
     "Exchange request token with access_token after authorization"
-    oauth_request = oauth.OAuthRequest.from_consumer_and_token(
-        consumer, token=request_token, oauth_callback=verifier, http_url=ACCESS_TOKEN_URL
-    )
-    oauth_request.sign_request(signature_method, consumer, request_token)
-    resp = fetch_urllib(oauth_request)
-    return oauth.OAuthToken.from_string(resp) 
+    return default_client.exchange_request_token(request_token, verifier, consumer, signature_method)
 
 def is_authenticated(access_token):
     "Checks if current access_token is good or not"
-    oauth_request = request_oauth_resource(CONSUMER, API_URL,\
-                                           access_token,\
-                                           parameters={'method':'test.echo',\
-                                                       'format':'json'})
-    json = urlopen(oauth_request.to_url()).read()
-    if 'auth_checked' in json:
-        return True
-    return False
-
-class Bag(object):
-    pass
+    return default_client.is_authenticated(access_token)
 
-#unmarshal taken and modified from pyamazon.py
-#makes the xml easy to work with
-def unmarshal(element):
-    rc = Bag()
-    if isinstance(element, minidom.Element):
-        for key in element.attributes.keys():
-            setattr(rc, key, element.attributes[key].value)
-            
-    childElements = [e for e in element.childNodes \
-                     if isinstance(e, minidom.Element)]
-    if childElements:
-        for child in childElements:
-            key = child.tagName
-            if hasattr(rc, key):
-                if type(getattr(rc, key)) <> type([]):
-                    setattr(rc, key, [getattr(rc, key)])
-                setattr(rc, key, getattr(rc, key) + [unmarshal(child)])
-            elif isinstance(child, minidom.Element) and \
-                     (child.tagName == 'Details'):
-                # make the first Details element a key
-                setattr(rc,key,[unmarshal(child)])
-                #dbg: because otherwise 'hasattr' only tests
-                #dbg: on the second occurence: if there's a
-                #dbg: single return to a query, it's not a
-                #dbg: list. This module should always
-                #dbg: return a list of Details objects.
-            else:
-                setattr(rc, key, unmarshal(child))
-    else:
-        #jec: we'll have the main part of the element stored in .text
-        #jec: will break if tag <text> is also present
-        text = "".join([e.data for e in element.childNodes \
-                        if isinstance(e, minidom.Text)])
-        setattr(rc, 'text', text)
-    return rc
+class XMLObjectParser(object):
+    """
+    Incremental expat parser for Eviscape xml responses.
+
+    Every child element of <objects> (<evis>, <node>, <members>, ...) is
+    turned into a flat dict holding its attributes and the text of its
+    child elements, and returned as a (tag, record) pair as soon as its end
+    tag has been parsed. No DOM is built.
+    """
+    def __init__(self):
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.parser.CharacterDataHandler = self.character_data
+        self.depth = 0
+        self.stat = None
+        self.err = {}
+        self.tag = None
+        self.record = None
+        self.field = None
+        self.text = []
+        self.ready = []
+
+    def start_element(self, name, attrs):
+        self.depth += 1
+        if self.depth == 1:
+            self.stat = attrs.get('stat', None)
+        elif self.depth == 2 and name == 'err':
+            self.err = attrs
+        elif self.depth == 3 and self.record is None:
+            self.tag = name
+            self.record = dict(attrs)
+        elif self.depth == 4 and self.record is not None:
+            self.field = name
+            self.text = []
+
+    def end_element(self, name):
+        if self.depth == 4 and self.field is not None:
+            self.record[self.field] = u''.join(self.text)
+            self.field = None
+        elif self.depth == 3 and self.record is not None:
+            self.ready.append((self.tag, self.record))
+            self.record = None
+        self.depth -= 1
+
+    def character_data(self, data):
+        # text of deeper elements is folded into their depth 4 ancestor
+        if self.field is not None:
+            self.text.append(data)
+
+    def feed(self, data):
+        "Parses ``data`` and returns the records completed by it"
+        self.parser.Parse(data, False)
+        ready, self.ready = self.ready, []
+        return ready
+
+    def close(self):
+        """
+        Finishes parsing, returns the remaining records and raises
+        EviscapeError if the response status was not ok.
+        """
+        self.parser.Parse('', True)
+        if not self.stat == 'ok':
+            msg = "ERROR [%s]: %s" % (self.err.get('code'), self.err.get('msg'))
+            raise EviscapeError, msg
+        ready, self.ready = self.ready, []
+        return ready
 
 #unique items from a list from the cookbook
 def uniq(alist):    # Fastest without order preserving
@@ -155,53 +209,439 @@ def prepare_params(params):
     return params
 
 def get_data_xml(xml):
-    """Given a bunch of XML back from Flickr, we turn it into a data structure
-    we can deal with (after checking for errors)."""
-    data = unmarshal(xml)
-    if not data.rsp.stat == 'ok':
-        msg = "ERROR [%s]: %s" % (data.rsp.err.code, data.rsp.err.msg)
-        raise EviscapeError, msg
-    return data
+    """Given a bunch of XML back from Eviscape, we turn it into a list of
+    (tag, record) pairs we can deal with (after checking for errors)."""
+    parser = XMLObjectParser()
+    data = parser.feed(xml)
+    return data + parser.close()
 
 def get_data_json(json):
-    print json
     if json['stat'] != 'ok':
         msg = "ERROR [%s]: %s" % (json['code'], json['msg'])
         raise EviscapeError, msg
     return json
 
+# size of the pieces handed to the incremental decoders
+STREAM_CHUNK_SIZE = 8192
+
+def iter_response(response, size=STREAM_CHUNK_SIZE):
+    """
+    Yields the body of a streamed (preload_content=False) response as it
+    arrives, closing the response if iteration stops early.
+    """
+    try:
+        for chunk in response.stream(size):
+            yield chunk
+    finally:
+        response.close()
+
+def iter_data_json(chunks):
+    """
+    Yields the items of the ``objects`` array of a json response while it
+    is being decoded, then checks the response status like get_data_json.
+    """
+    decoder = simplejson.JSONStreamDecoder('objects')
+    for obj in decoder.iterdecode(chunks):
+        yield obj
+    get_data_json(decoder.envelope)
+
+def iter_data_xml(chunks):
+    """
+    Yields the (tag, record) pairs of an xml response while it is being
+    parsed, then checks the response status like get_data_xml.
+    """
+    parser = XMLObjectParser()
+    for chunk in chunks:
+        for record in parser.feed(chunk):
+            yield record
+    for record in parser.close():
+        yield record
+
+def iter_data(chunks, formatter=None):
+    "Yields the objects of a response in ``formatter`` (default: the configured format)"
+    if (formatter or FORMATTER) == 'json':
+        return iter_data_json(chunks)
+    return iter_data_xml(chunks)
+
+def get_data(body, formatter=None):
+    "Parses a response body in ``formatter`` (default: the configured format), checking for errors"
+    if (formatter or FORMATTER) == 'json':
+        return get_data_json(simplejson.loads(body))
+    return get_data_xml(body)
+
+# set to a cache.MemoryCache or cache.DiskCache to cache the responses of
+# the read-only methods listed in its ttls
+response_cache = None
+
+# set to a cache.ValidatorCache to revalidate repeated requests with
+# conditional GETs (If-None-Match/If-Modified-Since)
+validator_cache = None
+
+# set to a ratelimit.RateLimiter to pace the calls which reach the server
+rate_limiter = None
+
+# identical public calls in flight at the same time share one request and
+# its parsed result; set to None to turn this off
+coalescer = SingleFlight()
+
+class EviscapeClient(object):
+    """
+    Talks to Eviscape on behalf of one application: it owns the consumer
+    (API key and secret), the response format, the connection pools, the
+    caches, the rate limiter and the coalescing of identical calls. Clients
+    share none of these, so one process can serve many API keys.
+
+    The model methods take the client to use as ``client=`` (default: the
+    module level client, configured by config.py and the globals above).
+
+    Usage: client = EviscapeClient('key', 'secret', rate_limiter=RateLimiter(5))
+           Nodes(id=17).get(client=client)
+    """
+    def __init__(self, api_key, api_secret, formatter=FORMATTER, api_url=API_URL,
+                 pool_manager=None, response_cache=None, validator_cache=None,
+                 rate_limiter=None, coalesce=True, oauth_in_header=False,
+                 signature_method=None):
+        self.consumer = oauth.OAuthConsumer(api_key, api_secret)
+        self.formatter = formatter
+        self.api_url = api_url
+        self.pool_manager = pool_manager or make_pool_manager()
+        self.response_cache = response_cache
+        self.validator_cache = validator_cache
+        self.rate_limiter = rate_limiter
+        self.coalescer = None
+        if coalesce:
+            self.coalescer = SingleFlight()
+        self.oauth_in_header = oauth_in_header
+        self.signature_method = signature_method or oauth.OAuthSignatureMethod_HMAC_SHA1()
+        # (http method, API method) -> escaped parameters shared by its requests
+        self.escaped_params = {}
+
+    @property
+    def http_pool(self):
+        "The connection pool of the API host"
+        return self.pool_manager.connection_from_url(self.api_url)
+
+    def _url(self, method, params):
+        return '%s?method=%s&format=%s&nojsoncallback&%s' % (self.api_url, method, self.formatter, urlencode(params))
+
+    def _sign(self, url, access_token, params, http_method='GET'):
+        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+            self.consumer, token=access_token, http_url=url, parameters=params, http_method=http_method
+        )
+        # successive calls of a method mostly send the same parameters, so
+        # they share the escaped ones; only the page, nonce, ... are escaped
+        key = (http_method, params.get('method'))
+        escaped = self.escaped_params.get(key)
+        if escaped is None:
+            if len(self.escaped_params) >= 100:
+                self.escaped_params.clear()
+            escaped = self.escaped_params[key] = {}
+        oauth_request.share_escaped(escaped)
+        oauth_request.sign_request(self.signature_method, self.consumer, access_token)
+        return oauth_request
+
+    def get_data(self, body):
+        return get_data(body, self.formatter)
+
+    def iter_data(self, chunks):
+        return iter_data(chunks, self.formatter)
+
+    def post_oauth_request(self, oauth_request, params={}, in_header=None, deadline=None):
+        """
+        POSTs a signed request over a pooled keep-alive connection. The oauth
+        parameters go into the form body, or the Authorization header if
+        ``in_header`` (default: oauth_in_header); nothing goes into the url.
+        Returns the HTTPResponse.
+        """
+        if in_header is None:
+            in_header = self.oauth_in_header
+        headers = {'Content-Type': FORM_CONTENT_TYPE}
+        if in_header:
+            headers.update(oauth_request.to_header())
+            body = urlencode(oauth_request.get_nonoauth_parameters())
+        else:
+            body = oauth_request.to_postdata()
+        if params:
+            body = '%s&%s' % (body, urlencode(params))
+        return self.pool_manager.urlopen('POST', oauth_request.get_normalized_http_url(),
+                                         body=body, headers=headers, deadline=deadline)
+
+    def get_oauth_request(self, oauth_request, in_header=None, **kw):
+        """
+        GETs a signed request. The oauth parameters go into the url, or the
+        Authorization header if ``in_header`` (default: oauth_in_header), in
+        which case the url only carries the API parameters. Other keyword
+        arguments are passed to PoolManager.get_url. Returns the HTTPResponse.
+        """
+        if in_header is None:
+            in_header = self.oauth_in_header
+        if not in_header:
+            return self.pool_manager.get_url(oauth_request.to_url(), **kw)
+        headers = dict(kw.pop('headers', None) or {})
+        headers.update(oauth_request.to_header())
+        return self.pool_manager.get_url(oauth_request.to_nonoauth_url(), headers=headers, **kw)
+
+    def fetch_oauth(self, oauth_request, params={}):
+        "Sends a signed request to an OAuth endpoint, returns the body"
+        if oauth_request.http_method.upper() == 'POST':
+            return self.post_oauth_request(oauth_request, params).data
+        return self.get_oauth_request(oauth_request).data
+
+    def fetch_url(self, url, **kw):
+        "GET any url (static files, permalinks, ...) through the pools, returns the body"
+        return self.pool_manager.get_url(url, **kw).data
+
+    def get_request_token(self, callback=None, consumer=None, signature_method=None):
+        "Ask Eviscape OAuth server for a request_token"
+        consumer = consumer or self.consumer
+        signature_method = signature_method or self.signature_method
+        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+            consumer, oauth_callback=callback, http_url=REQUEST_TOKEN_URL
+        )
+        oauth_request.sign_request(signature_method, consumer, None)
+        return oauth.OAuthToken.from_string(self.fetch_oauth(oauth_request))
+
+    def get_authorisation_url(self, token, perms='write', consumer=None, signature_method=None):
+        "Ask Eviscape OAuth server for a authroization URL"
+        consumer = consumer or self.consumer
+        signature_method = signature_method or self.signature_method
+        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+            consumer, perms=perms, token=token, http_url=AUTHORIZATION_URL
+        )
+        oauth_request.sign_request(signature_method, consumer, token)
+        return oauth_request.to_url()
+
+    def exchange_request_token(self, request_token, verifier, consumer=None, signature_method=None):
+        "Exchange request token with access_token after authorization"
+        consumer = consumer or self.consumer
+        signature_method = signature_method or self.signature_method
+        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+            consumer, token=request_token, oauth_callback=verifier, http_url=ACCESS_TOKEN_URL
+        )
+        oauth_request.sign_request(signature_method, consumer, request_token)
+        return oauth.OAuthToken.from_string(self.fetch_oauth(oauth_request))
+
+    def is_authenticated(self, access_token):
+        "Checks if current access_token is good or not"
+        oauth_request = self._sign(self.api_url, access_token,\
+                                   {'method':'test.echo', 'format':'json'})
+        json = self.get_oauth_request(oauth_request).data
+        if 'auth_checked' in json:
+            return True
+        return False
+
+    def reset_after_fork(self):
+        """
+        Drop the connections and in-flight calls inherited from the parent
+        process; call it at the start of a pre-forked worker. Pools, caches
+        and settings are kept. (Pools also reset themselves on their first
+        use in a new process.)
+        """
+        self.pool_manager.reset_after_fork()
+        if self.coalescer is not None:
+            self.coalescer.reset_after_fork()
+
+    def throttle(self, method, end=None):
+        """
+        Waits until the rate_limiter (if any) allows a call to ``method``.
+        Raises DeadlineExceeded at once if that would take past ``end``.
+        """
+        if self.rate_limiter is not None:
+            if self.rate_limiter.wait(method, time_left(end)) is None:
+                e = DeadlineExceeded("Deadline exceeded waiting for the rate limit of %s" % method)
+                e.request_sent = False
+                raise e
+
+    def cached_get(self, method, params, fetch, access_token=None, end=None):
+        """
+        Returns the parsed response of ``fetch(headers)`` (which performs the
+        GET with the extra ``headers`` and returns the HTTPResponse), which
+        is not throttled past ``end``.
+
+        A fresh entry of response_cache is served without any request. Otherwise
+        the validators kept by validator_cache make the request conditional, and
+        a 304 Not Modified returns the data parsed from the previous response.
+        Only responses which parsed without error are stored.
+        """
+        cache = self.response_cache
+        if cache is not None and cache.ttl(method):
+            body = cache.get(method, params, access_token)
+            if body is not None:
+                return self.get_data(body)
+        validators = self.validator_cache
+        if validators is not None and not validators.ttl(method):
+            validators = None
+        headers = {}
+        entry = None
+        if validators is not None:
+            entry = validators.get(method, params, access_token)
+            if entry is not None:
+                etag, modified, data = entry
+                if etag:
+                    headers['If-None-Match'] = etag
+                if modified:
+                    headers['If-Modified-Since'] = modified
+        self.throttle(method, end)
+        response = fetch(headers)
+        if response.status == 304 and entry is not None:
+            validators.not_modified += 1
+            return entry[2]
+        data = self.get_data(response.data)
+        if cache is not None and cache.ttl(method):
+            cache.set(method, params, response.data, access_token)
+        if validators is not None:
+            etag = response.getheader('etag')
+            modified = response.getheader('last-modified')
+            if etag or modified:
+                validators.set(method, params, (etag, modified, data), access_token)
+        return data
+
+    def request_get(self, method, **params):
+        """
+        Calls a public API method and returns the parsed response. A
+        ``deadline`` parameter is not sent but bounds the seconds the call may
+        take (with retries); the same goes for the other request methods.
+
+        While an identical call is in flight its result is shared (see
+        coalescer) unless ``coalesce=False`` is passed. The shared data must
+        not be modified. A caller's deadline only bounds its own wait for a
+        shared call; a call with a deadline is never shared with others.
+        """
+        end = deadline_end(params.pop('deadline', None))
+        coalesce = params.pop('coalesce', True)
+        params = prepare_params(params)
+        url = self._url(method, params)
+        def call():
+            return self.cached_get(method, params, lambda headers: self.pool_manager.get_url(url, headers=headers,\
+                                                                                             deadline=time_left(end)),\
+                                   end=end)
+        flight = self.coalescer
+        if not coalesce or flight is None:
+            return call()
+        items = params.items()
+        items.sort()
+        try:
+            return flight.do((method, tuple(items)), call, time_left(end), lead=end is None)
+        except JobTimeout:
+            raise DeadlineExceeded("Deadline exceeded waiting for a shared %s call" % method)
+
+    def request_protected_get(self, method, access_token, **params):
+        end = deadline_end(params.pop('deadline', None))
+        p = params
+        p['method'] = method
+        p['format'] = self.formatter
+        p['nojsoncallback'] = '1'
+        params = prepare_params(params)
+        url = self._url(method, params)
+        def fetch(headers):
+            oauth_request = self._sign(url, access_token, p)
+            return self.get_oauth_request(oauth_request, headers=headers, deadline=time_left(end))
+        return self.cached_get(method, params, fetch, access_token, end)
+
+    def request_iter(self, method, **params):
+        """
+        Same as request_get but returns a generator over the raw objects of the
+        response (json dicts, or (tag, record) pairs for xml), each one yielded
+        as soon as it is decoded.
+        """
+        end = deadline_end(params.pop('deadline', None))
+        params = prepare_params(params)
+        url = self._url(method, params)
+        self.throttle(method, end)
+        return self.iter_data(iter_response(self.pool_manager.get_url(url, preload_content=False,\
+                                                                      deadline=time_left(end))))
+
+    def request_protected_iter(self, method, access_token, **params):
+        "Same as request_iter but for protected methods"
+        end = deadline_end(params.pop('deadline', None))
+        p = params
+        p['method'] = method
+        p['format'] = self.formatter
+        p['nojsoncallback'] = '1'
+        params = prepare_params(params)
+        url = self._url(method, params)
+        oauth_request = self._sign(url, access_token, p)
+        self.throttle(method, end)
+        return self.iter_data(iter_response(self.get_oauth_request(oauth_request, preload_content=False,\
+                                                                   deadline=time_left(end))))
+
+    def request_protected_post(self, method, access_token, **params):
+        end = deadline_end(params.pop('deadline', None))
+        p = params
+        p['method'] = method
+        p['format'] = self.formatter
+        p['nojsoncallback'] = '1'
+        params = prepare_params(params)
+        oauth_request = self._sign(self.api_url, access_token, params, http_method='POST')
+        self.throttle(method, end)
+        return self.get_data(self.post_oauth_request(oauth_request, deadline=time_left(end)).data)
+
+
+def _module_global(name):
+    "Property reading and writing the module global ``name``"
+    def get(self):
+        return globals()[name]
+    def set(self, value):
+        globals()[name] = value
+    return property(get, set)
+
+class ModuleClient(EviscapeClient):
+    """
+    The default client: instead of keeping its own settings it uses the
+    module globals (CONSUMER, FORMATTER, pool_manager, response_cache, ...),
+    so code configuring utils directly keeps working.
+    """
+    def __init__(self):
+        self.escaped_params = {}
+
+    consumer = _module_global('CONSUMER')
+    formatter = _module_global('FORMATTER')
+    api_url = _module_global('API_URL')
+    pool_manager = _module_global('pool_manager')
+    response_cache = _module_global('response_cache')
+    validator_cache = _module_global('validator_cache')
+    rate_limiter = _module_global('rate_limiter')
+    coalescer = _module_global('coalescer')
+    oauth_in_header = _module_global('OAUTH_IN_HEADER')
+    signature_method = _module_global('signature_method')
+
+default_client = ModuleClient()
+
+def get_client(client=None):
+    "``client``, or the default client if None"
+    if client is None:
+        return default_client
+    return client
+
+def reset_after_fork():
+    "See EviscapeClient.reset_after_fork"
+    default_client.reset_after_fork()
+
+def throttle(method, end=None):
+    "Waits until rate_limiter (if any) allows a call to ``method``"
+    return default_client.throttle(method, end)
+
+def cached_get(method, params, fetch, access_token=None, end=None):
+    "See EviscapeClient.cached_get"
+    return default_client.cached_get(method, params, fetch, access_token, end)
+
 def request_get(method, **params):
-    params = prepare_params(params)
-    url = '%s?method=%s&format=%s&nojsoncallback&%s' % (API_URL, method, FORMATTER, urlencode(params))
-    if FORMATTER == 'json':
-        return get_data_json(simplejson.loads(http_pool.get_url(url).data))
-    return get_data_xml(minidom.parseString(http_pool.get_url(url).data))
+    "See EviscapeClient.request_get"
+    return default_client.request_get(method, **params)
 
 def request_protected_get(method, access_token, **params):
-    p = params
-    p['method'] = method
-    p['format'] = FORMATTER
-    p['nojsoncallback'] = '1'
-    params = prepare_params(params)
-    url = '%s?method=%s&format=%s&nojsoncallback&%s' % (API_URL, method, FORMATTER, urlencode(params))
-    oauth_request = request_oauth_resource(CONSUMER, url, access_token, parameters=p)
-    print oauth_request.to_url()
-    if FORMATTER == 'json':
-        return get_data_json(simplejson.loads(http_pool.get_url(oauth_request.to_url()).data))
-    return get_data_xml(minidom.parseString(http_pool.get_url(oauth_request.to_url()).data))
+    return default_client.request_protected_get(method, access_token, **params)
+
+def request_iter(method, **params):
+    "See EviscapeClient.request_iter"
+    return default_client.request_iter(method, **params)
+
+def request_protected_iter(method, access_token, **params):
+    "Same as request_iter but for protected methods"
+    return default_client.request_protected_iter(method, access_token, **params)
 
 def request_protected_post(method, access_token, **params):
-    p = params
-    p['method'] = method
-    p['format'] = FORMATTER
-    p['nojsoncallback'] = '1'
-    params = prepare_params(params)
-    url = '%s?method=%s&format=%s&nojsoncallback&%s' % (API_URL, method, FORMATTER, urlencode(params))
-    oauth_request = request_oauth_resource(CONSUMER, url, access_token, parameters=p, http_method='POST')
-    if FORMATTER == 'json':
-        dat = urlopen(oauth_request.to_url(), urlencode(params)).read()
-        return get_data_json(simplejson.loads(dat))
-    return get_data_xml(minidom.parseString(urlopen(oauth_request.to_url(), urlencode(params)).read()))
+    return default_client.request_protected_post(method, access_token, **params)
 
 
 class Promise(object):
@@ -0,0 +1,221 @@
+"""
+Eviscape API wrapper
+Author: Deepak Thukral<deepak@musicpictures.com>
+Thread helpers used to run API calls in the background.
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import sys
+import threading
+from Queue import Queue
+
+
+class JobTimeout(RuntimeError):
+    "Raised by Job.result() when the call does not finish in time."
+    pass
+
+
+class Job(object):
+    """
+    A call running on a background thread.
+
+    Usage: job = Job(Nodes(id=17).get).start(); node = job.result()
+    Any exception raised by the call is re-raised by result().
+    """
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.exc_info = None
+        self.finished = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def run(self):
+        "Performs the call in the current thread and stores its outcome"
+        try:
+            self.value = self.func(*self.args, **self.kwargs)
+        except:
+            self.exc_info = sys.exc_info()
+        self.lock.acquire()
+        try:
+            self.finished.set()
+            callbacks, self.callbacks = self.callbacks, []
+        finally:
+            self.lock.release()
+        for callback in callbacks:
+            callback(self)
+
+    def start(self):
+        "Performs the call on a new daemon thread"
+        thread = threading.Thread(target=self.run)
+        thread.setDaemon(True)
+        thread.start()
+        return self
+
+    def done(self):
+        return self.finished.isSet()
+
+    def add_done_callback(self, callback):
+        """
+        Calls ``callback(job)`` once the call has finished, from the thread
+        which ran it (or right away if it already has).
+        """
+        self.lock.acquire()
+        try:
+            if not self.finished.isSet():
+                self.callbacks.append(callback)
+                return
+        finally:
+            self.lock.release()
+        callback(self)
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to finish and returns its value (or raises its
+        exception). Raises JobTimeout if ``timeout`` seconds pass first.
+        """
+        self.finished.wait(timeout)
+        if not self.finished.isSet():
+            raise JobTimeout("Job did not finish within %s seconds" % timeout)
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.value
+
+
+class WorkerPool(object):
+    """
+    A fixed number of daemon threads running Jobs from a shared queue.
+
+    Usage: pool = WorkerPool(10); nodes = pool.map(Nodes.get, [Nodes(id=17)]); pool.close()
+    """
+    def __init__(self, size=10):
+        self.size = size
+        self.reset_after_fork()
+
+    def reset_after_fork(self):
+        """
+        Forget the queue and threads inherited from the parent process (a
+        forked child only has the thread which forked); it is done anyway
+        on the first submit in a new process.
+        """
+        self.pid = os.getpid()
+        self.queue = Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            job.run()
+
+    def submit(self, func, *args, **kwargs):
+        "Queues a call and returns its Job, starting the threads on first use"
+        if self.pid != os.getpid():
+            self.reset_after_fork()
+        self.lock.acquire()
+        try:
+            while len(self.threads) < self.size:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self.threads.append(thread)
+        finally:
+            self.lock.release()
+        job = Job(func, *args, **kwargs)
+        self.queue.put(job)
+        return job
+
+    def map(self, func, items):
+        """
+        Calls ``func`` with every item concurrently and returns the results
+        in the order of ``items``. A call which raised leaves its exception
+        in its place instead of aborting the others.
+        """
+        jobs = [self.submit(func, item) for item in items]
+        results = []
+        for job in jobs:
+            try:
+                results.append(job.result())
+            except Exception, e:
+                results.append(e)
+        return results
+
+    def close(self):
+        "Stops the threads once the queued jobs are done"
+        self.lock.acquire()
+        try:
+            for thread in self.threads:
+                self.queue.put(None)
+            self.threads = []
+        finally:
+            self.lock.release()
+
+
+class SingleFlight(object):
+    """
+    Lets concurrent identical calls share one execution: while a call for
+    ``key`` is running, further calls for the same key wait for it and get
+    its result (or its exception) instead of running their own.
+
+    Usage: flight = SingleFlight(); data = flight.do(url, lambda: fetch(url))
+    """
+    def __init__(self):
+        self.executed = 0
+        self.shared = 0
+        self.reset_after_fork()
+
+    def reset_after_fork(self):
+        "Forget the calls in flight in the parent process, they never finish here"
+        self.pid = os.getpid()
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func, timeout=None, lead=True):
+        """
+        Runs ``func()`` unless a call for ``key`` is in flight, in which
+        case its outcome is waited for (up to ``timeout`` seconds, raising
+        JobTimeout) and returned.
+
+        With ``lead`` False the call joins a call in flight but never has
+        others join it: when there is none, ``func()`` just runs. This is
+        for a ``func`` with limits of its own (a deadline) which must not be
+        imposed on the callers sharing its outcome.
+        """
+        if self.pid != os.getpid():
+            self.reset_after_fork()
+        self.lock.acquire()
+        try:
+            job = self.calls.get(key)
+            leader = job is None
+            if leader:
+                self.executed += 1
+                if lead:
+                    job = self.calls[key] = Job(func)
+            else:
+                self.shared += 1
+        finally:
+            self.lock.release()
+        if leader and not lead:
+            return func()
+        if leader:
+            try:
+                job.run()
+            finally:
+                self.lock.acquire()
+                try:
+                    del self.calls[key]
+                finally:
+                    self.lock.release()
+        return job.result(timeout)
+
+    def stats(self):
+        return {'executed': self.executed, 'shared': self.shared,
+                'in_flight': len(self.calls)}
@@ -0,0 +1,166 @@
+"""
+Eviscape API wrapper
+Tests of the compressed responses of urllib3.HTTPConnectionPool, against a
+local stand-in server.
+
+Usage: python -m unittest discover tests
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import gzip
+import os
+import resource
+import sys
+import threading
+import unittest
+import zlib
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pyeviscape'))
+
+from urllib3 import HTTPConnectionPool, DecodeError
+
+BODY = '{"rsp": {"stat": "ok", "evis": [%s]}}' % ', '.join(['"evis %d"' % i for i in range(500)])
+
+
+def gzipped(data):
+    out = StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    f.write(data)
+    f.close()
+    return out.getvalue()
+
+def raw_deflated(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class Handler(BaseHTTPRequestHandler):
+    "Answers /<encoding> with BODY encoded that way, /echo with the request's Accept-Encoding"
+    protocol_version = 'HTTP/1.1'
+
+    bodies = {
+        '/gzip': ('gzip', gzipped(BODY)),
+        '/deflate': ('deflate', zlib.compress(BODY)),
+        '/raw-deflate': ('deflate', raw_deflated(BODY)),
+        '/broken': ('gzip', 'this is not gzip' * 10),
+    }
+
+    def do_GET(self):
+        if self.path == '/echo':
+            encoding, body = None, self.headers.get('Accept-Encoding', '')
+        else:
+            encoding, body = self.bodies[self.path]
+        self.send_response(200)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ServerTestCase(unittest.TestCase):
+    "Runs the stand-in server; ``pool`` asks it for compressed responses"
+
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.port = self.server.server_address[1]
+        self.pools = []
+        self.pool = self.make_pool(compress=True)
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_pool(self, **kwargs):
+        pool = HTTPConnectionPool('127.0.0.1', self.port, timeout=5, **kwargs)
+        self.pools.append(pool)
+        return pool
+
+
+class CompressionTest(ServerTestCase):
+
+    def test_gzip(self):
+        self.assertEqual(self.pool.get_url('/gzip').data, BODY)
+
+    def test_zlib_deflate(self):
+        self.assertEqual(self.pool.get_url('/deflate').data, BODY)
+
+    def test_raw_deflate(self):
+        self.assertEqual(self.pool.get_url('/raw-deflate').data, BODY)
+
+    def test_streamed_gzip(self):
+        response = self.pool.get_url('/gzip', preload_content=False)
+        self.assertEqual(''.join(response.stream(64)), BODY)
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+
+    def test_broken_body(self):
+        self.assertRaises(DecodeError, self.pool.get_url, '/broken')
+
+    def test_accept_encoding(self):
+        self.assertEqual(self.pool.get_url('/echo').data, 'gzip, deflate')
+
+    def test_accept_encoding_passthrough(self):
+        response = self.pool.get_url('/echo', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response.data, 'gzip')
+
+    def test_no_compress(self):
+        # httplib asks for the identity encoding itself
+        self.assertEqual(self.make_pool().get_url('/echo').data, 'identity')
+
+    def test_broken_body_frees_slot(self):
+        # a blocking pool would run out of connections if a DecodeError
+        # kept its connection's slot taken
+        pool = self.make_pool(compress=True, maxsize=2, block=True, pool_timeout=1)
+        for i in range(5):
+            self.assertRaises(DecodeError, pool.get_url, '/broken')
+        self.assertEqual(pool.get_url('/gzip').data, BODY)
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+
+class ReuseTest(ServerTestCase):
+    "Keep-alive connections are reused"
+
+    def test_reuse(self):
+        for i in range(3):
+            self.assertEqual(self.pool.get_url('/echo').data, 'gzip, deflate')
+        stats = self.pool.stats()
+        self.assertEqual((stats['created'], stats['reaped']), (1, 0))
+
+    def test_reuse_high_fd(self):
+        # select() cannot check a descriptor above FD_SETSIZE (1024)
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard != resource.RLIM_INFINITY and hard < 1200:
+            self.skipTest('cannot open 1200 files')
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, 1200), hard))
+        fds = []
+        try:
+            while not fds or fds[-1] < 1100:
+                fds.append(os.open(os.devnull, os.O_RDONLY))
+            self.test_reuse()
+            self.assertTrue(self.pool.pool.queue[-1].sock.fileno() > 1024)
+        finally:
+            for fd in fds:
+                os.close(fd)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Eviscape API wrapper
+Tests of simplejson.JSONStreamDecoder, decoding responses cut into chunks
+wherever the network may cut them.
+
+Usage: python -m unittest discover tests
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pyeviscape'))
+
+import simplejson
+from simplejson import JSONStreamDecoder
+
+# a page of evis.timeline, with the numbers and constants a page may hold
+PAGE = '''{"stat": "ok", "page": 1, "per_page": 3, "total": 2500,
+ "objects": [
+  {"evi_id": 17, "evi_permalink": "http://www.eviscape.com/evis/17/",
+   "evi_subject": "caf\\u00e9 \\"news\\"", "evi_rating": 4.25,
+   "evi_is_private": false, "nod_id": 3, "evi_location": null},
+  {"evi_id": 18, "evi_subject": "[]{},:", "evi_rating": -1.5e-3,
+   "evi_is_private": true, "tags": ["a", "b"], "evi_location": {"lat": 52.52, "lng": 13.4E+2}},
+  2500.0, -12, 3e10, 0.5, true, null, "last"
+ ],
+ "version": 1.0}'''
+
+
+class StreamDecoderTest(unittest.TestCase):
+
+    def decode(self, chunks):
+        decoder = JSONStreamDecoder('objects')
+        objects = list(decoder.iterdecode(chunks))
+        decoder.envelope['objects'] = objects
+        return decoder.envelope
+
+    def test_every_split(self):
+        expected = simplejson.loads(PAGE)
+        for i in range(len(PAGE) + 1):
+            self.assertEqual(self.decode([PAGE[:i], PAGE[i:]]), expected,
+                             'split at %d: %r' % (i, PAGE[max(i - 10, 0):i]))
+
+    def test_bytewise(self):
+        self.assertEqual(self.decode(list(PAGE)), simplejson.loads(PAGE))
+
+    def test_number_split_after_dot(self):
+        doc = '{"objects":[{"a":1},2500.0,3]}'
+        i = doc.index('2500.') + len('2500.')
+        self.assertEqual(self.decode([doc[:i], doc[i:]])['objects'], [{'a': 1}, 2500.0, 3])
+
+    def test_truncated(self):
+        decoder = JSONStreamDecoder('objects')
+        self.assertRaises(ValueError, list, decoder.iterdecode([PAGE[:-20]]))
+
+    def test_truncated_number(self):
+        decoder = JSONStreamDecoder('objects')
+        self.assertRaises(ValueError, list, decoder.iterdecode(['{"objects": [2500.']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Eviscape API wrapper
+Tests of resuming an interrupted bulk write from its journal.
+
+Usage: python -m unittest discover tests
+
+The MIT License
+
+Copyright (c) 2009 MMIX Musicpictures Ltd, Berlin
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pyeviscape'))
+
+from eviscape import _post_many
+from journal import Journal, PostInDoubt, make_key
+from urllib3 import HTTPError, CircuitOpenError
+from utils import EviscapeError
+
+
+class Crash(Exception):
+    "Stands in for the process dying"
+    pass
+
+
+class CrashingJournal(Journal):
+    "Dies right after writing the record ``crash_after``"
+    def __init__(self, path, crash_after):
+        Journal.__init__(self, path)
+        self.crash_after = crash_after
+
+    def _write(self, line):
+        Journal._write(self, line)
+        if line == self.crash_after:
+            raise Crash(line)
+
+
+class Post(object):
+    def __init__(self, id, subject):
+        self.id = id
+        self.subject = subject
+
+
+class Eviscape(object):
+    """
+    Stand-in for Evis.post: subjects in ``errors`` raise their error
+    instead of being posted, the others get the next id
+    """
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.posted = []
+        self.lock = threading.Lock()
+
+    def post(self, access_token=None, deadline=None, client=None, subject=None):
+        if subject in self.errors:
+            raise self.errors[subject]
+        self.lock.acquire()
+        try:
+            self.posted.append(subject)
+            return Post(len(self.posted), subject)
+        finally:
+            self.lock.release()
+
+
+def rebuild(item, id):
+    return Post(int(id), item['subject'])
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'import.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_posts(self, items, journal, eviscape):
+        try:
+            return _post_many(eviscape.post, items, 'token', journal, workers=2,
+                              rebuild=rebuild)
+        finally:
+            journal.close()
+
+    def test_resume(self):
+        items = [dict(subject=subject) for subject in
+                 ('started', 'done', 'fine', 'rejected', 'unsent', 'lost')]
+        unsent = CircuitOpenError('circuit open')
+        unsent.request_sent = False
+        errors = {'rejected': EviscapeError('rejected'), 'unsent': unsent,
+                  'lost': HTTPError('connection reset')}
+
+        first = Eviscape(errors)
+        journal = CrashingJournal(self.path, 'S %s' % make_key(items[0]))
+        results = self.run_posts(items, journal, first)
+        self.assertTrue(isinstance(results[0], Crash))
+        self.assertEqual(sorted(first.posted), ['done', 'fine'])
+        self.assertTrue(isinstance(results[3], EviscapeError))
+        self.assertTrue(isinstance(results[4], CircuitOpenError))
+        self.assertTrue(isinstance(results[5], HTTPError))
+        done_id = results[1].id
+
+        # the second run no longer fails, but only sends what never arrived
+        second = Eviscape()
+        results = self.run_posts(items, Journal(self.path), second)
+        self.assertTrue(isinstance(results[0], PostInDoubt))
+        self.assertEqual((results[1].id, results[1].subject), (done_id, 'done'))
+        self.assertEqual(results[2].subject, 'fine')
+        self.assertTrue(isinstance(results[5], PostInDoubt))
+        self.assertEqual(sorted(second.posted), ['rejected', 'unsent'])
+
+    def test_crash_after_done(self):
+        items = [dict(subject='a'), dict(subject='b')]
+        first = Eviscape()
+        journal = CrashingJournal(self.path, 'D %s 1' % make_key(items[0]))
+        results = self.run_posts(items[:1], journal, first)
+        self.assertTrue(isinstance(results[0], Crash))
+        self.assertEqual(first.posted, ['a'])
+
+        second = Eviscape()
+        results = self.run_posts(items, Journal(self.path), second)
+        self.assertEqual((results[0].id, results[0].subject), (1, 'a'))
+        self.assertEqual(second.posted, ['b'])
+
+    def test_rebuild_required(self):
+        journal = Journal(self.path)
+        try:
+            self.assertRaises(TypeError, _post_many, Eviscape().post, [], 'token', journal)
+        finally:
+            journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()